@@ -1,22 +1,68 @@
+import collections
 import sqlite3
 
 class ExecuteQuery:
-    def __init__(self, db_name, query, params=None):
+    """Runs a query for the duration of a with block.
+
+    By default the block gets every row as a list. With stream=True it gets
+    a lazy iterator that fetches `arraysize` rows at a time, so a large scan
+    runs in constant memory; the connection stays open until the block
+    exits, and the iterator cannot be used after that.
+
+    row_type picks what each row is: None for tuples, 'dict' for
+    {column: value} dicts, 'namedtuple' for namedtuples named after the
+    columns, or any callable, which is called with the column values.
+    """
+
+    def __init__(self, db_name, query, params=None, stream=False, arraysize=1000,
+                 row_type=None):
         self.db_name = db_name
         self.query = query
         self.params = params if params is not None else ()
+        self.stream = stream
+        self.arraysize = arraysize
+        self.row_type = row_type
         self.conn = None
         self.cursor = None
         self.results = None
 
+    def _row_factory(self):
+        # Installed on the cursor after execute, once the columns are known,
+        # so sqlite3 builds each row as it is fetched
+        if self.row_type is None:
+            return None
+        columns = [column[0] for column in self.cursor.description]
+        if self.row_type == 'dict':
+            return lambda cursor, row: dict(zip(columns, row))
+        if self.row_type == 'namedtuple':
+            make = collections.namedtuple('Row', columns, rename=True)._make
+            return lambda cursor, row: make(row)
+        row_type = self.row_type
+        return lambda cursor, row: row_type(*row)
+
+    def _iter_rows(self):
+        while True:
+            rows = self.cursor.fetchmany()
+            if not rows:
+                return
+            yield from rows
+
     def __enter__(self):
         self.conn = sqlite3.connect(self.db_name)
         self.cursor = self.conn.cursor()
+        self.cursor.arraysize = self.arraysize
         self.cursor.execute(self.query, self.params)
-        self.results = self.cursor.fetchall()
+        if self.cursor.description is not None:
+            self.cursor.row_factory = self._row_factory()
+        if self.stream:
+            self.results = self._iter_rows()
+        else:
+            self.results = self.cursor.fetchall()
         return self.results
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.stream and self.results is not None:
+            self.results.close()
         if self.cursor:
             self.cursor.close()
         if self.conn:
@@ -29,3 +75,9 @@ if __name__ == "__main__":
     with ExecuteQuery(db_name, query, params) as results:
         for row in results:
             print(row)
+
+    # Same query, streamed 500 rows at a time as dicts
+    with ExecuteQuery(db_name, query, params, stream=True, arraysize=500,
+                      row_type='dict') as rows:
+        for row in rows:
+            print(row)
@@ -1,20 +1,17 @@
 
 import sqlite3
-import functools
-from datetime import datetime
+
+import query_logging
 
 #### decorator to log SQL queries
 
-def log_queries(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # Extract the query parameter - it can be a keyword argument or positional argument
-        query = kwargs.get('query')
-        if query is None and len(args) > 0:
-            query = args[0]
-        print(f"[{datetime.now()}] Executing SQL query: {query}")
-        return func(*args, **kwargs)
-    return wrapper
+# Queries are logged as JSON lines from a background thread, so logging
+# adds only a timer and a queue put to each call
+query_logging.configure()
+
+def log_queries(func=None, **options):
+    # Bare (@log_queries) or with options (@log_queries(sample_rate=0.1, slow_ms=50))
+    return query_logging.log_queries(func, **options)
 
 @log_queries
 def fetch_all_users(query):
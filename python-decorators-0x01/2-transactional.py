@@ -1,6 +1,11 @@
 import sqlite3 
 import functools
 
+# Commits on success and rolls back on error; nested calls on the same
+# connection use savepoints. transactions.GroupCommitter batches the commits
+# of many calls into one.
+from transactions import transactional
+
 def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -12,18 +17,6 @@ def with_db_connection(func):
         return result
     return wrapper
 
-def transactional(func):
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            raise e
-    return wrapper
-
 @with_db_connection 
 @transactional 
 def update_user_email(conn, user_id, new_email): 
@@ -6,6 +6,8 @@ import time
 import sqlite3 
 import functools
 
+import retry
+
 #### paste your with_db_decorator here
 def with_db_connection(func):
     @functools.wraps(func)
@@ -18,23 +20,11 @@ def with_db_connection(func):
         return result
     return wrapper
 
-def retry_on_failure(retries=3, delay=2):
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(1, retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    if attempt < retries:
-                        print(f"Attempt {attempt} failed, retrying in {delay} seconds...")
-                        time.sleep(delay)
-                    else:
-                        raise last_exception
-        return wrapper
-    return decorator
+def retry_on_failure(retries=3, delay=2, **options):
+    # Retries only transient errors (database locked/busy), waiting a random
+    # time of up to delay * 2**attempt seconds, within the shared retry budget
+    # and circuit breaker; see retry.retry_on_failure for the options
+    return retry.retry_on_failure(retries=retries, delay=delay, verbose=True, **options)
 
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
@@ -6,6 +6,8 @@ import time
 import sqlite3 
 import functools
 
+from cache_layer import QueryCache, cached
+
 def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
@@ -17,27 +19,17 @@ def with_db_connection(func):
         return result
     return wrapper
 
-query_cache = {}
+# Results are kept per (query, params) for up to five minutes, bounded by
+# entry count and total size; commits through transactional() invalidate the
+# entries reading the tables they wrote. To share results between processes
+# on this host, pass backend=SharedMemoryBackend('users_cache') (or
+# SQLiteBackend(path) for a cache that outlives a reboot). For a minute after
+# an entry expires it is still served while one caller refreshes it, so
+# expiry does not send every caller to the database at once.
+query_cache = QueryCache(max_entries=256, max_bytes=16 * 1024 * 1024, ttl=300, stale_ttl=60)
 
 def cache_query(func):
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        # Get the SQL query from arguments
-        query = kwargs.get('query')
-        if query is None and len(args) > 0:
-            query = args[0]
-        
-        # Check if result is already cached
-        if query in query_cache:
-            print(f"Using cached result for query: {query}")
-            return query_cache[query]
-        
-        # Execute the function and cache the result
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result
-        print(f"Caching result for query: {query}")
-        return result
-    return wrapper
+    return cached(query_cache, verbose=True)(func)
 
 @with_db_connection
 @cache_query
@@ -0,0 +1,203 @@
+import contextlib
+import datetime
+import functools
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import connection_pool
+import query_logging
+import statement_cache
+from cache_layer import MemoryBackend, QueryCache, SharedMemoryBackend, SQLiteBackend
+
+# The task scripts run their demo on import; keep it out of the report
+with contextlib.redirect_stdout(io.StringIO()):
+    with_db_connection = __import__('1-with_db_connection').with_db_connection
+
+
+def _latencies(func, calls, *args, **kwargs):
+    """Calls func `calls` times and returns each call's latency in microseconds."""
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000000)
+    return samples
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p99_us': samples[min(int(len(samples) * 0.99), len(samples) - 1)],
+    }
+
+
+def _get_user_by_id(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+    return cursor.fetchone()
+
+
+def bench_with_db_connection(calls=5000):
+    """Per-call latency of get_user_by_id with a connection per call vs the pool."""
+    per_call = with_db_connection(_get_user_by_id)
+    pooled = connection_pool.with_db_connection(_get_user_by_id)
+    pooled(user_id=1)  # open and configure the pooled connection outside the timing
+    return {
+        'connect_per_call': _summary(_latencies(per_call, calls, user_id=1)),
+        'pooled': _summary(_latencies(pooled, calls, user_id=1)),
+    }
+
+
+# Result sets of different sizes: the users table itself, and a generated
+# one big enough for (de)serialization to matter
+CACHE_QUERIES = {
+    'users': ("SELECT * FROM users", ()),
+    'generated_10k': (
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+        "SELECT i, 'user' || i, 'user' || i || '@example.com', i % 90 FROM n",
+        (10000,),
+    ),
+}
+
+
+def _run_query(conn, query, params):
+    return conn.execute(query, params).fetchall()
+
+
+def bench_cache_backends(calls=2000):
+    """Latency of a cache hit in each backend vs recomputing the query.
+
+    A hit in the memory backend returns the stored object; the SQLite and
+    shared-memory backends pay for a lookup plus unpickling on every hit,
+    which is the cost of sharing results between processes.
+    """
+    directory = tempfile.mkdtemp()
+    name = f'benchmark_cache_{os.getpid()}'
+    backends = {
+        'memory': MemoryBackend(),
+        'sqlite': SQLiteBackend(os.path.join(directory, 'cache.sqlite')),
+        'shared_memory': SharedMemoryBackend(name),
+    }
+    report = {}
+    try:
+        with connection_pool.get_pool('users.db').connection() as conn:
+            for label, (query, params) in CACHE_QUERIES.items():
+                report[f'{label}:recompute'] = _summary(
+                    _latencies(_run_query, calls, conn, query, params)
+                )
+                result = _run_query(conn, query, params)
+                for backend_name, backend in backends.items():
+                    cache = QueryCache(ttl=None, backend=backend)
+                    key = cache.make_key(query, params)
+                    cache.set(key, result, tables={'users'})
+                    report[f'{label}:{backend_name}'] = _summary(
+                        _latencies(cache.get, calls, key)
+                    )
+    finally:
+        for backend in backends.values():
+            if hasattr(backend, 'path'):
+                backend.close()
+                for suffix in ('', '-wal', '-shm'):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(backend.path + suffix)
+        os.rmdir(directory)
+    return report
+
+
+def _print_logged(func):
+    # The original log_queries: a synchronous print per call
+    @functools.wraps(func)
+    def wrapper(conn, query, params=()):
+        print(f"[{datetime.datetime.now()}] Executing SQL query: {query}")
+        return func(conn, query, params)
+    return wrapper
+
+
+def bench_log_queries(calls=5000):
+    """Per-call latency of a fast query unlogged, printed, and through query_logging.
+
+    drain_us_per_call adds the listener's work left over when the calls end.
+    """
+    query, params = "SELECT * FROM users WHERE id = ?", (1,)
+    report = {}
+    with open(os.devnull, 'w') as devnull, \
+            connection_pool.get_pool('users.db').connection() as conn:
+        report['unlogged'] = _summary(_latencies(_run_query, calls, conn, query, params))
+        with contextlib.redirect_stdout(devnull):
+            report['print'] = _summary(
+                _latencies(_print_logged(_run_query), calls, conn, query, params)
+            )
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(query_logging.JsonFormatter())
+        for rate in (1.0, 0.01):
+            query_logging.configure(handler, sample_rate=rate, max_queue=calls)
+            logged = query_logging.log_queries(_run_query)
+            summary = report[f'queued_sample_{rate:g}'] = _summary(
+                _latencies(logged, calls, conn, query, params)
+            )
+            # Records still queued when the loop ends are written here; spread
+            # over the calls, this is the background work the samples miss
+            start = time.perf_counter()
+            query_logging.shutdown()
+            summary['drain_us_per_call'] = (time.perf_counter() - start) * 1000000 / calls
+    return report
+
+
+def _get_user_by_query(conn, query, params=()):
+    return conn.execute(query, params).fetchone()
+
+
+def bench_statement_cache(calls=5000, distinct_ids=1000):
+    """Repeated get_user_by_id lookups with the id inlined, parameterized by
+    statement_cache.prepared, and bound by hand.
+
+    With more distinct ids than the connection's cached_statements, inlined
+    ids miss sqlite3's statement cache on every call and re-parse the SQL.
+    """
+    ids = [i % distinct_ids + 1 for i in range(calls)]
+    prepared = statement_cache.prepared(_get_user_by_query)
+    report = {}
+    with connection_pool.get_pool('users.db').connection() as conn:
+        def run(lookup):
+            samples = []
+            for user_id in ids:
+                start = time.perf_counter()
+                lookup(user_id)
+                samples.append((time.perf_counter() - start) * 1000000)
+            return samples
+
+        report['inlined_literal'] = _summary(run(
+            lambda user_id: _get_user_by_query(conn, f"SELECT * FROM users WHERE id = {user_id}")
+        ))
+        statement_cache.reset_stats()
+        report['prepared'] = _summary(run(
+            lambda user_id: prepared(conn, f"SELECT * FROM users WHERE id = {user_id}")
+        ))
+        report['prepared']['hit_rate'] = statement_cache.stats()['hit_rate']
+        report['bound_parameter'] = _summary(run(
+            lambda user_id: _get_user_by_query(conn, "SELECT * FROM users WHERE id = ?", (user_id,))
+        ))
+    return report
+
+
+def print_report(report):
+    """Prints one line per benchmark case."""
+    for name, result in report.items():
+        line = (f"{name:<28} mean={result['mean_us']:.1f}us "
+                f"p50={result['p50_us']:.1f}us p99={result['p99_us']:.1f}us")
+        if 'hit_rate' in result:
+            line += f" statement_hit_rate={result['hit_rate']:.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    print_report(bench_with_db_connection())
+    print_report(bench_cache_backends())
+    print_report(bench_log_queries())
+    print_report(bench_statement_cache())
@@ -0,0 +1,738 @@
+import asyncio
+import collections
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sqlite3
+import stat
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+from sql_utils import compact_sql, query_and_params, tables_read
+
+# Every QueryCache registers itself so writes can invalidate all of them
+_caches = weakref.WeakSet()
+
+
+def _freeze(value):
+    """Turns bind parameters into something hashable for use in a cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _size_of(value):
+    """Approximate size in bytes of a cached result."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires_at', 'tables')
+
+    def __init__(self, value, size, expires_at, tables):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.tables = tables
+
+
+class MemoryBackend:
+    """In-process LRU store: an OrderedDict bounded by entry count and total size."""
+
+    # Calls only take a short in-process lock, so coroutines may make them directly
+    blocking = False
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Returns ('hit', value), ('expired', None) or ('miss', None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 'miss', None
+            if entry.expires_at is not None and entry.expires_at <= time.time():
+                self._remove(key)
+                return 'expired', None
+            self._entries.move_to_end(key)
+            return 'hit', entry.value
+
+    def set(self, key, value, ttl, tables):
+        """Stores an entry and returns how many older ones were evicted to fit it."""
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return 0
+        expires_at = time.time() + ttl if ttl is not None else None
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, expires_at, tables)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        return evicted
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def invalidate_tables(self, tables):
+        """Drops the entries reading any of `tables`; returns how many were dropped."""
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry.tables is None or entry.tables & tables
+            ]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def contains(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (
+                entry.expires_at is None or entry.expires_at > time.time()
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self):
+        """Returns (entries, bytes) currently stored."""
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SQLiteBackend:
+    """On-disk store shared by every process that opens the same file.
+
+    Values are pickled into an SQLite table. Recency is tracked in a
+    last_used column, so LRU eviction by entry count and by total size
+    holds across all processes using the file. The file is a cache, so it
+    is written without fsync (synchronous=OFF); WAL lets readers in other
+    processes proceed while one process writes.
+
+    Being a cache, it gives way under contention: a read that finds the
+    file locked is a miss, and a write that cannot get the lock is
+    skipped, so callers go to the database instead of failing. Values are
+    unpickled, so the file must only be writable by trusted users.
+
+    Invalidations run after the write has committed, so they must not fail
+    it either: one that still finds the file locked after
+    INVALIDATE_TIMEOUT seconds is kept and retried by later calls, which
+    treat every read as a miss until it gets through. QueryCache's
+    generation check only sees this process's writes; another process can
+    still store a result it read before such a write committed, and that
+    entry lives until its ttl or the next invalidation of its tables.
+    """
+
+    # last_used is only rewritten on hits this many seconds apart
+    TOUCH_INTERVAL = 1.0
+    # Longest an invalidation waits for another process's write lock
+    INVALIDATE_TIMEOUT = 0.1
+    # Calls do file I/O and may wait on other processes' locks
+    blocking = True
+
+    def __init__(self, path, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Invalidations that found the file locked: tables, or everything
+        self._pending = set()
+        self._pending_clear = False
+        self._conn = sqlite3.connect(
+            path, timeout=5, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache ("
+            "key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, tables TEXT, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS query_cache_last_used ON query_cache (last_used)"
+        )
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha256(pickle.dumps(key, protocol=4)).digest()
+
+    def get(self, key):
+        """Returns ('hit', value), ('expired', None) or ('miss', None)."""
+        digest = self._digest(key)
+        now = time.time()
+        with self._lock:
+            if not self._catch_up():
+                return 'miss', None
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at, last_used FROM query_cache WHERE key = ?",
+                    (digest,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                return 'miss', None
+            if row is None:
+                return 'miss', None
+            value, expires_at, last_used = row
+            expired = expires_at is not None and expires_at <= now
+            try:
+                if expired:
+                    self._conn.execute("DELETE FROM query_cache WHERE key = ?", (digest,))
+                # Skipping most recency updates keeps hits from turning into writes
+                elif now - last_used >= self.TOUCH_INTERVAL:
+                    self._conn.execute(
+                        "UPDATE query_cache SET last_used = ? WHERE key = ?", (now, digest)
+                    )
+            except sqlite3.OperationalError:
+                # Expiry and recency are best effort; a later call catches up
+                pass
+        if expired:
+            return 'expired', None
+        return 'hit', pickle.loads(value)
+
+    def set(self, key, value, ttl, tables):
+        """Stores an entry and returns how many older ones were evicted to fit it."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return 0
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        # Commas on both ends let invalidate_tables match whole names with LIKE
+        tables = ',' + ','.join(sorted(tables)) + ',' if tables is not None else None
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # Another process holds the write lock; leave this one uncached
+                return 0
+            try:
+                self._delete_pending()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_cache "
+                    "(key, value, size, expires_at, tables, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._digest(key), blob, len(blob), expires_at, tables, now)
+                )
+                # Keep the most recently used entries that fit both limits
+                evicted = self._conn.execute(
+                    "DELETE FROM query_cache WHERE key IN ("
+                    " SELECT key FROM ("
+                    "  SELECT key,"
+                    "   SUM(size) OVER (ORDER BY last_used DESC, rowid DESC) AS running,"
+                    "   ROW_NUMBER() OVER (ORDER BY last_used DESC, rowid DESC) AS rank"
+                    "  FROM query_cache)"
+                    " WHERE running > ? OR rank > ?)",
+                    (self.max_bytes, self.max_entries)
+                ).rowcount
+                self._conn.execute("COMMIT")
+                self._pending.clear()
+                self._pending_clear = False
+            except sqlite3.OperationalError:
+                self._conn.execute("ROLLBACK")
+                return 0
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return evicted
+
+    def invalidate_tables(self, tables):
+        """Drops the entries reading any of `tables`; returns how many were dropped."""
+        with self._lock:
+            self._pending |= tables
+            try:
+                return self._apply_pending()
+            except sqlite3.OperationalError:
+                return 0
+
+    def _delete_pending(self):
+        if self._pending_clear:
+            return self._conn.execute("DELETE FROM query_cache").rowcount
+        if not self._pending:
+            return 0
+        clauses = ' OR '.join(['tables LIKE ?'] * len(self._pending))
+        return self._conn.execute(
+            f"DELETE FROM query_cache WHERE tables IS NULL OR {clauses}",
+            [f'%,{table},%' for table in self._pending]
+        ).rowcount
+
+    def _apply_pending(self):
+        # Wait only briefly: the caller's write has already committed
+        self._conn.execute(f"PRAGMA busy_timeout = {int(self.INVALIDATE_TIMEOUT * 1000)}")
+        try:
+            dropped = self._delete_pending()
+        finally:
+            self._conn.execute("PRAGMA busy_timeout = 5000")
+        self._pending.clear()
+        self._pending_clear = False
+        return dropped
+
+    def _catch_up(self):
+        """Applies pending invalidations; False while the file is still locked."""
+        if not self._pending and not self._pending_clear:
+            return True
+        try:
+            self._apply_pending()
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def contains(self, key):
+        with self._lock:
+            if not self._catch_up():
+                return False
+            row = self._conn.execute(
+                "SELECT expires_at FROM query_cache WHERE key = ?", (self._digest(key),)
+            ).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    def clear(self):
+        with self._lock:
+            self._pending_clear = True
+            try:
+                self._apply_pending()
+            except sqlite3.OperationalError:
+                pass
+
+    def usage(self):
+        """Returns (entries, bytes) currently stored."""
+        with self._lock:
+            self._catch_up()
+            return self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_cache"
+            ).fetchone()
+
+    def close(self):
+        """Closes this process's handle; the file and its entries stay for the others."""
+        self._conn.close()
+
+
+class SharedMemoryBackend(SQLiteBackend):
+    """SQLiteBackend kept in shared memory (/dev/shm) instead of on disk.
+
+    Processes on one host share it the same way, but reads and writes never
+    touch the disk. Falls back to the temp directory where /dev/shm does
+    not exist. The file lives in a directory private to the current user
+    (mode 0700), so other users can neither read the cached results nor
+    plant entries that get unpickled; PermissionError is raised if that
+    directory or the file is not the user's own.
+    """
+
+    def __init__(self, name='query_cache', max_entries=1024, max_bytes=64 * 1024 * 1024):
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        directory = os.path.join(base, f'query_cache-{os.getuid()}')
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        _check_private(directory, directory=True)
+        path = os.path.join(directory, f'{name}.sqlite')
+        if os.path.lexists(path):
+            _check_private(path, directory=False)
+        super().__init__(path, max_entries, max_bytes)
+
+
+def _check_private(path, directory):
+    """Raises PermissionError unless path is ours, not a symlink, and closed to others."""
+    info = os.lstat(path)
+    kind_ok = stat.S_ISDIR(info.st_mode) if directory else stat.S_ISREG(info.st_mode)
+    if not kind_ok or info.st_uid != os.getuid() or (
+        directory and info.st_mode & 0o077
+    ):
+        raise PermissionError(f"{path} is not private to this user; refusing to use it")
+
+
+class QueryCache:
+    """Thread-safe cache of query results in front of a pluggable store.
+
+    Entries are keyed by the SQL text and its bind parameters, expire after
+    `ttl` seconds (None for never), and are evicted least-recently-used
+    first once there are more than max_entries of them or their combined
+    size passes max_bytes. Each entry remembers the tables its query reads
+    so that invalidate_tables() can drop exactly the results a write made
+    stale.
+
+    With stale_ttl, an entry is kept that many seconds past its ttl and
+    reported as 'stale' by lookup(), so cached() can keep serving it while
+    a single caller refreshes it.
+
+    A result read before a write commits must not be stored after that
+    write's invalidation. Each invalidation bumps a per-table generation;
+    callers take generation(tables) before running the query and pass it
+    to set(), which drops the result if any of its tables moved on since.
+
+    The store defaults to a MemoryBackend built from the limits above; pass
+    backend=SQLiteBackend(path) or SharedMemoryBackend(name) (which carry
+    their own limits) to share cached results between processes.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300, backend=None,
+                 stale_ttl=0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend or MemoryBackend(max_entries, max_bytes)
+        self._stats = collections.Counter()
+        self._stats_lock = threading.Lock()
+        # Invalidations per table, and in total for entries of unknown tables
+        self._generations = collections.Counter()
+        self._writes = 0
+        # Invalidations of every table at once, which all generations include
+        self._epoch = 0
+        self._write_lock = threading.Lock()
+        _caches.add(self)
+
+    @staticmethod
+    def make_key(query, params=()):
+        """Builds the cache key of a query and its bind parameters."""
+        return compact_sql(query), _freeze(params or ())
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def lookup(self, key):
+        """Returns ('fresh', value), ('stale', value) or ('miss', None).
+
+        'stale' means the entry is past its ttl but still inside the
+        stale_ttl grace period, where it may be served while it is refreshed.
+        """
+        status, stored = self.backend.get(key)
+        if status == 'expired':
+            self._count('expirations')
+        if status != 'hit':
+            self._count('misses')
+            return 'miss', None
+        fresh_until, value = stored
+        if fresh_until is not None and fresh_until <= time.time():
+            self._count('stale_hits')
+            return 'stale', value
+        self._count('hits')
+        return 'fresh', value
+
+    def peek(self, key):
+        """Like lookup(), but without touching the hit/miss counters."""
+        status, stored = self.backend.get(key)
+        if status != 'hit':
+            return 'miss', None
+        fresh_until, value = stored
+        if fresh_until is not None and fresh_until <= time.time():
+            return 'stale', value
+        return 'fresh', value
+
+    def get(self, key):
+        """Returns (True, value) for a fresh entry, (False, None) otherwise."""
+        status, value = self.lookup(key)
+        if status != 'fresh':
+            return False, None
+        return True, value
+
+    def generation(self, tables=None):
+        """Returns how many invalidations have hit `tables` (None: any table) so far."""
+        with self._write_lock:
+            return self._generation(tables)
+
+    def _generation(self, tables):
+        if tables is None:
+            return self._writes
+        return self._epoch + sum(self._generations[table] for table in tables)
+
+    def set(self, key, value, tables=None, ttl=None, generation=None):
+        """Stores value under key; tables=None means it is invalidated by any write.
+
+        When `generation` (from generation(tables) before the query ran) is
+        out of date, a write invalidated the tables meanwhile and the value
+        is dropped instead, returning False.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        fresh_until = time.time() + ttl if ttl is not None else None
+        # The backend keeps the entry through the stale period as well
+        if ttl is not None:
+            ttl += self.stale_ttl
+        with self._write_lock:
+            if generation is not None and generation != self._generation(tables):
+                self._count('discarded')
+                return False
+            evicted = self.backend.set(key, (fresh_until, value), ttl, tables)
+        if evicted:
+            self._count('evictions', evicted)
+        return True
+
+    def invalidate_tables(self, tables):
+        """Drops every entry that reads one of `tables` (or whose tables are unknown).
+
+        tables=None, for a write whose target is unknown, drops every entry.
+        """
+        if tables is None:
+            with self._write_lock:
+                self._writes += 1
+                self._epoch += 1
+                dropped = self.backend.usage()[0]
+                self.backend.clear()
+            self._count('invalidations', dropped)
+            return
+        tables = {table.lower() for table in tables}
+        if tables:
+            # Under the same lock as set(), so no stale result lands in between
+            with self._write_lock:
+                self._writes += 1
+                self._generations.update(tables)
+                dropped = self.backend.invalidate_tables(tables)
+            self._count('invalidations', dropped)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Returns hit/miss/eviction counters plus the current size."""
+        entries, size = self.backend.usage()
+        stats = {
+            'entries': entries,
+            'bytes': size,
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'discarded': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+        with self._stats_lock:
+            stats.update(self._stats)
+        served = stats['hits'] + stats['stale_hits']
+        lookups = served + stats['misses']
+        stats['hit_rate'] = served / lookups if lookups else 0.0
+        return stats
+
+    def __contains__(self, key):
+        """True while key has an entry, fresh or stale."""
+        return self.backend.contains(key)
+
+    def __len__(self):
+        return self.backend.usage()[0]
+
+
+def invalidate_tables(tables):
+    """Invalidates `tables` in every live QueryCache; called after writes commit.
+
+    tables=None (a write whose target is unknown) empties every cache.
+    """
+    for cache in list(_caches):
+        cache.invalidate_tables(tables)
+
+
+def _cache_key(cache, args, kwargs):
+    query, params, _ = query_and_params(args, kwargs)
+    if query is None:
+        raise TypeError("cached() functions take the query as a string, after the connection")
+    return query, cache.make_key(query, params)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, wait=True, default=None, on_wait=None):
+        """Returns func()'s result, or that of the call already running for key.
+
+        The caller that finds no call running executes func; the others
+        block until it finishes (calling on_wait() first, if given) and get
+        its result or its exception. With wait=False they return `default`
+        at once instead.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not wait:
+                return default
+            if on_wait is not None:
+                on_wait()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+# Set on a call whose leader was cancelled, sending its waiters to retry
+_ABANDONED = object()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaiters of one key share one call.
+
+    Cancelling the caller running the call cancels only that caller: one
+    of its waiters runs the call again in its place.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, factory, wait=True, default=None, on_wait=None):
+        """Awaits factory(), or the call already running for key; see SingleFlight.do."""
+        # Futures belong to one event loop, so calls are tracked per loop. The
+        # check-and-insert below has no await in it, which makes it atomic
+        # within the loop without an asyncio.Lock.
+        loop = asyncio.get_running_loop()
+        while True:
+            future = self._calls.get((loop, key))
+            if future is None:
+                break
+            if not wait:
+                return default
+            if on_wait is not None:
+                on_wait()
+                on_wait = None
+            # shield: one waiter being cancelled must not cancel the shared call
+            result = await asyncio.shield(future)
+            if result is not _ABANDONED:
+                return result
+        future = self._calls[(loop, key)] = loop.create_future()
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.set_result(_ABANDONED)
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            # Retrieved here so an unawaited failure is not reported as lost
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[(loop, key)]
+
+
+def _async_cached(cache, ttl, verbose, func):
+    flights = AsyncSingleFlight()
+    # Backends that block (or may, if they do not say) run on a worker
+    # thread so they never stall the event loop; the memory backend is
+    # called inline, as a thread hop would cost more than the lookup
+    if getattr(cache.backend, 'blocking', True):
+        def call(method, *args, **kwargs):
+            return asyncio.to_thread(method, *args, **kwargs)
+    else:
+        async def call(method, *args, **kwargs):
+            return method(*args, **kwargs)
+
+    @functools.wraps(func)
+    async def wrapper(conn, *args, **kwargs):
+        query, key = _cache_key(cache, args, kwargs)
+
+        async def load():
+            status, result = await call(cache.peek, key)
+            if status == 'fresh':
+                return result
+            tables = tables_read(query) or None
+            generation = cache.generation(tables)
+            result = await func(conn, *args, **kwargs)
+            stored = await call(
+                cache.set, key, result, tables=tables, ttl=ttl, generation=generation
+            )
+            if stored and verbose:
+                print(f"Caching result for query: {query}")
+            return result
+
+        status, result = await call(cache.lookup, key)
+        if status == 'fresh':
+            if verbose:
+                print(f"Using cached result for query: {query}")
+            return result
+        if status == 'stale':
+            if verbose:
+                print(f"Using stale cached result for query: {query}")
+            return await flights.do(key, load, wait=False, default=result)
+        return await flights.do(key, load, on_wait=lambda: cache._count('coalesced'))
+    return wrapper
+
+
+def cached(cache, ttl=None, verbose=False):
+    """Decorator factory caching func(conn, query, params=...) results in `cache`.
+
+    The key is the query plus its params, and the entry is tagged with the
+    tables the query reads for invalidation on commit. Concurrent misses
+    for one key run the query once; the other threads wait for and share
+    that result. A stale entry (see QueryCache.stale_ttl) is returned
+    straight away while the first caller to see it refreshes it inline,
+    on its own connection, since the connection is only the caller's for
+    the duration of the call. Coroutine functions are coalesced per event
+    loop with AsyncSingleFlight, so waiting never blocks the loop, and
+    reach a blocking backend (SQLite, shared memory) through
+    asyncio.to_thread.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            return _async_cached(cache, ttl, verbose, func)
+        flights = SingleFlight()
+
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            query, key = _cache_key(cache, args, kwargs)
+
+            def load():
+                # A leader that just finished may have stored it already
+                status, result = cache.peek(key)
+                if status == 'fresh':
+                    return result
+                tables = tables_read(query) or None
+                generation = cache.generation(tables)
+                result = func(conn, *args, **kwargs)
+                stored = cache.set(key, result, tables=tables, ttl=ttl, generation=generation)
+                if stored and verbose:
+                    print(f"Caching result for query: {query}")
+                return result
+
+            status, result = cache.lookup(key)
+            if status == 'fresh':
+                if verbose:
+                    print(f"Using cached result for query: {query}")
+                return result
+            if status == 'stale':
+                if verbose:
+                    print(f"Using stale cached result for query: {query}")
+                return flights.do(key, load, wait=False, default=result)
+            return flights.do(key, load, on_wait=lambda: cache._count('coalesced'))
+        return wrapper
+    return decorator
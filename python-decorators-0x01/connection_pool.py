@@ -0,0 +1,268 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import queue
+import sqlite3
+import threading
+
+try:
+    import aiosqlite
+except ImportError:  # only needed to decorate coroutine functions
+    aiosqlite = None
+
+# Applied to every pooled connection when it is opened. WAL lets readers run
+# alongside a writer, and synchronous=NORMAL drops the fsync on every commit
+# (still safe against corruption in WAL mode).
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+}
+
+
+class SQLitePool:
+    """Bounded pool of sqlite3 connections to one database file.
+
+    Connections are opened on demand up to max_size, configured once with
+    `pragmas`, and reused most-recently-used first. acquire() waits up to
+    `timeout` seconds for a free connection before giving up.
+    """
+
+    def __init__(self, db_name='users.db', max_size=4, pragmas=None, timeout=5,
+                 cached_statements=128):
+        self.db_name = db_name
+        self.max_size = max_size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        # Guards _opened and _closed; release() checks _closed and queues under it
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        # Connections are handed to whichever thread acquires them next, but
+        # only ever used by one thread at a time
+        conn = sqlite3.connect(
+            self.db_name,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self, timeout=None):
+        """Returns a connection from the pool, opening one if the pool is not full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.max_size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No pooled connection to {self.db_name} became free in time"
+            ) from None
+
+    def release(self, conn):
+        """Hands a connection back, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = True
+        except sqlite3.Error:
+            reusable = False
+        with self._lock:
+            reusable = reusable and not self._closed
+            if reusable:
+                self._idle.put(conn)
+            else:
+                self._opened -= 1
+        if not reusable:
+            conn.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Context manager that borrows a connection for the duration of the block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Closes the idle connections; connections in use are closed when released."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+# The AsyncSQLitePool entered by the current task (or the one that started it)
+_async_pool = contextvars.ContextVar('async_pool', default=None)
+
+
+async def _connect_async(db_name, pragmas):
+    conn = await aiosqlite.connect(db_name)
+    for name, value in pragmas.items():
+        await conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class AsyncSQLitePool:
+    """SQLitePool for aiosqlite connections, scoped to an `async with` block.
+
+    aiosqlite runs each connection on its own non-daemon thread, so pooled
+    connections must be closed before the interpreter can exit. Rather
+    than outliving the event loop, the pool lives for the block:
+
+        async with AsyncSQLitePool('users.db'):
+            await asyncio.gather(...)
+
+    and async functions decorated with with_db_connection borrow from it
+    for the same database while inside the block.
+    """
+
+    def __init__(self, db_name='users.db', max_size=4, pragmas=None, timeout=5):
+        if aiosqlite is None:
+            raise RuntimeError("aiosqlite is required to pool async connections")
+        self.db_name = db_name
+        self.max_size = max_size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.timeout = timeout
+        self._idle = asyncio.LifoQueue()
+        self._opened = 0
+        self._closed = False
+
+    async def acquire(self, timeout=None):
+        """Returns a connection from the pool, opening one if the pool is not full."""
+        if self._idle.empty() and self._opened < self.max_size:
+            self._opened += 1
+            try:
+                return await _connect_async(self.db_name, self.pragmas)
+            except Exception:
+                self._opened -= 1
+                raise
+        try:
+            return await asyncio.wait_for(
+                self._idle.get(), self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            raise sqlite3.OperationalError(
+                f"No pooled connection to {self.db_name} became free in time"
+            ) from None
+
+    async def release(self, conn):
+        """Hands a connection back, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            reusable = not self._closed
+        except sqlite3.Error:
+            reusable = False
+        if not reusable:
+            self._opened -= 1
+            await conn.close()
+            return
+        self._idle.put_nowait(conn)
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """Async context manager that borrows a connection for the block."""
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def close(self):
+        """Closes the idle connections; connections in use are closed when released."""
+        self._closed = True
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            await conn.close()
+            self._opened -= 1
+
+    async def __aenter__(self):
+        self._token = _async_pool.set(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        _async_pool.reset(self._token)
+        await self.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_name='users.db', **kwargs):
+    """Returns the shared pool for db_name, creating it with kwargs on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_name)
+        if pool is None:
+            pool = _pools[db_name] = SQLitePool(db_name, **kwargs)
+        return pool
+
+
+@contextlib.asynccontextmanager
+async def async_connection(db_name='users.db'):
+    """Borrows from the AsyncSQLitePool entered for db_name, else opens a connection."""
+    pool = _async_pool.get()
+    if pool is not None and pool.db_name == db_name:
+        async with pool.connection() as conn:
+            yield conn
+        return
+    if aiosqlite is None:
+        raise RuntimeError("aiosqlite is required for async connections")
+    conn = await _connect_async(db_name, DEFAULT_PRAGMAS)
+    try:
+        yield conn
+    finally:
+        await conn.close()
+
+
+def with_db_connection(func=None, *, db_name='users.db'):
+    """Pooled drop-in replacement for with_db_connection.
+
+    Passes a connection as the first argument like the original, but
+    borrows it from the shared pool for db_name instead of opening and
+    closing one per call. Usable bare (@with_db_connection) or with a
+    database name (@with_db_connection(db_name='other.db')). Coroutine
+    functions get an aiosqlite connection from async_connection().
+    """
+    if func is None:
+        return functools.partial(with_db_connection, db_name=db_name)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with async_connection(db_name) as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with get_pool(db_name).connection() as conn:
+            return func(conn, *args, **kwargs)
+    return wrapper
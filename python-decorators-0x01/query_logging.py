@@ -0,0 +1,316 @@
+import atexit
+import collections
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import random
+import sys
+import threading
+import time
+
+from sql_utils import query_and_params
+
+logger = logging.getLogger('queries')
+
+# Fields a query record carries besides the standard LogRecord attributes
+QUERY_FIELDS = ('query', 'function', 'duration_ms', 'rowcount', 'error')
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (second, formatted timestamp) of the last record; most share it
+        self._stamp = (None, '')
+        self._encoder = json.JSONEncoder(default=str)
+
+    def format(self, record):
+        fields = {field: getattr(record, field, None) for field in QUERY_FIELDS}
+        return self.format_fields(record.created, record.levelno, record.getMessage(), fields)
+
+    def format_fields(self, created, level, message, fields):
+        """format() for the raw fields of a record, without building the LogRecord."""
+        second = int(created)
+        cached_second, stamp = self._stamp
+        if second != cached_second:
+            stamp = time.strftime('%Y-%m-%dT%H:%M:%S', self.converter(created))
+            self._stamp = (second, stamp)
+        entry = {
+            'ts': f'{stamp}.{int((created - second) * 1000):03d}',
+            'level': logging.getLevelName(level),
+            'event': message,
+        }
+        for field, value in fields.items():
+            if value is not None:
+                entry[field] = value
+        return self._encoder.encode(entry)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks or formats on the calling thread.
+
+    Records are appended as they are to a bounded deque, which takes no
+    lock and wakes no thread, leaving all formatting to the listener. They
+    are dropped (and counted) when it is full rather than stalling the
+    query that produced them.
+    """
+
+    def __init__(self, max_queue):
+        super().__init__(collections.deque())
+        self.max_queue = max_queue
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+        else:
+            self.queue.append(record)
+
+
+class _Listener:
+    """Background thread writing out the queued records in batches.
+
+    It wakes every `interval` seconds and drains whatever has accumulated,
+    so a burst of queries costs one wake-up rather than one per record.
+    Bare tuples from log_queries going to a JSON StreamHandler are
+    formatted straight from their fields and written with a single
+    write(); anything else becomes a LogRecord passed to handler.handle().
+    """
+
+    def __init__(self, buffer, handler, interval=0.05):
+        self.buffer = buffer
+        self.handler = handler
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='query-log', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Writes out what is still queued and stops the thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._flush()
+        self._flush()
+
+    def _drain(self):
+        items = []
+        try:
+            while True:
+                items.append(self.buffer.popleft())
+        except IndexError:
+            return items
+
+    def _flush(self):
+        items = self._drain()
+        if not items:
+            return
+        handler = self.handler
+        formatter = handler.formatter
+        if not (isinstance(handler, logging.StreamHandler)
+                and isinstance(formatter, JsonFormatter) and not handler.filters):
+            for item in items:
+                handler.handle(self._record(item))
+            return
+        lines = []
+        for item in items:
+            if isinstance(item, logging.LogRecord):
+                lines.append(formatter.format(item))
+            else:
+                lines.append(formatter.format_fields(*self._unpack(item)))
+        lines.append('')
+        try:
+            with handler.lock:
+                handler.stream.write(handler.terminator.join(lines))
+            handler.flush()
+        except Exception:
+            handler.handleError(self._record(items[-1]))
+
+    @staticmethod
+    def _unpack(item):
+        """Turns a tuple queued by _log into (created, level, message, fields)."""
+        created, query, function, duration, rowcount, error = item
+        fields = {
+            'query': query,
+            'function': function,
+            'duration_ms': round(duration * 1000, 3) if duration is not None else None,
+            'rowcount': rowcount,
+            'error': repr(error) if error is not None else None,
+        }
+        if error is not None:
+            return created, logging.ERROR, 'query failed', fields
+        return created, logging.INFO, 'query executed', fields
+
+    @classmethod
+    def _record(cls, item):
+        if isinstance(item, logging.LogRecord):
+            return item
+        created, level, message, fields = cls._unpack(item)
+        record = logger.makeRecord(logger.name, level, __file__, 0, message, (), None,
+                                   extra=fields)
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        return record
+
+
+class _Config:
+    handler = None
+    listener = None
+    sample_rate = 1.0
+    slow_ms = None
+
+
+_config = _Config()
+_config_lock = threading.Lock()
+
+
+def configure(handler=None, level=logging.INFO, sample_rate=1.0, slow_ms=None,
+              max_queue=10000, flush_interval=0.05):
+    """Routes query logs through a background thread to `handler`.
+
+    `handler` defaults to a JSON-lines StreamHandler on stdout. Only a
+    `sample_rate` fraction of queries is logged, except that failed queries
+    and those taking at least `slow_ms` milliseconds always are. Records
+    are written out every `flush_interval` seconds, at most `max_queue` at
+    a time being held. Calling it again replaces the previous configuration.
+    """
+    if handler is None:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+    with _config_lock:
+        shutdown()
+        queue_handler = DroppingQueueHandler(max_queue)
+        listener = _Listener(queue_handler.queue, handler, flush_interval)
+        listener.start()
+        logger.addHandler(queue_handler)
+        logger.setLevel(level)
+        logger.propagate = False
+        _config.handler = queue_handler
+        _config.listener = listener
+        _config.sample_rate = sample_rate
+        _config.slow_ms = slow_ms
+
+
+def shutdown():
+    """Writes out the queued records and stops the background thread."""
+    if _config.listener is not None:
+        _config.listener.stop()
+        logger.removeHandler(_config.handler)
+        _config.listener = None
+        _config.handler = None
+
+
+atexit.register(shutdown)
+
+
+def stats():
+    """Returns the number of records dropped because the queue was full."""
+    handler = _config.handler
+    return {'dropped': handler.dropped if handler is not None else 0}
+
+
+def _rowcount(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    rowcount = getattr(result, 'rowcount', None)
+    return rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
+
+
+def log_queries(func=None, *, sample_rate=None, slow_ms=None):
+    """Decorator logging each query a function runs, with its timing and row count.
+
+    Usable bare (@log_queries) or with per-function overrides of the
+    configure() settings (@log_queries(sample_rate=0.01, slow_ms=50)). The
+    query is the `query` argument, or the first string among the first two
+    positional arguments. Logging happens on configure()'s background
+    thread; the decorated call only times itself and, if sampled, queues a
+    record. Coroutine functions are timed across their awaits.
+    """
+    if func is None:
+        return functools.partial(log_queries, sample_rate=sample_rate, slow_ms=slow_ms)
+
+    def should_time():
+        """Returns (sampled, slow threshold) for one call, or None to skip logging."""
+        if not logger.isEnabledFor(logging.INFO):
+            return None
+        rate = _config.sample_rate if sample_rate is None else sample_rate
+        slow = _config.slow_ms if slow_ms is None else slow_ms
+        return rate >= 1 or random.random() < rate, slow
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            decision = should_time()
+            if decision is None:
+                return await func(*args, **kwargs)
+            sampled, slow = decision
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as error:
+                _log(func, args, kwargs, time.perf_counter() - start, None, error)
+                raise
+            duration = time.perf_counter() - start
+            if sampled or (slow is not None and duration * 1000 >= slow):
+                _log(func, args, kwargs, duration, result, None)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        decision = should_time()
+        if decision is None:
+            return func(*args, **kwargs)
+        sampled, slow = decision
+        if not sampled and slow is None:
+            # Nothing to time, unless the query fails
+            try:
+                return func(*args, **kwargs)
+            except Exception as error:
+                _log(func, args, kwargs, None, None, error)
+                raise
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as error:
+            _log(func, args, kwargs, time.perf_counter() - start, None, error)
+            raise
+        duration = time.perf_counter() - start
+        if sampled or duration * 1000 >= slow:
+            _log(func, args, kwargs, duration, result, None)
+        return result
+    return wrapper
+
+
+def _query_of(args, kwargs):
+    # Decorated functions take the query either first or after the connection
+    if args and not isinstance(args[0], str):
+        args = args[1:]
+    return query_and_params(args, kwargs)[0]
+
+
+def _log(func, args, kwargs, duration, result, error):
+    handler = _config.handler
+    if handler is None:
+        return
+    # Only what must be captured now is queued; the listener thread rounds,
+    # reprs and builds the record from this tuple (see _Listener._unpack)
+    handler.enqueue((
+        time.time(),
+        _query_of(args, kwargs),
+        func.__qualname__,
+        duration,
+        _rowcount(result) if result is not None else None,
+        error,
+    ))
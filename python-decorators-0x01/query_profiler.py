@@ -0,0 +1,193 @@
+import bisect
+import functools
+import sqlite3
+import threading
+import time
+
+from sql_utils import normalize_sql, query_and_params, traced_statements
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class StatementStats:
+    """Latency histogram and totals for one normalized statement."""
+
+    __slots__ = ('sql', 'calls', 'errors', 'rows', 'total_ms', 'min_ms', 'max_ms',
+                 'buckets', 'slow_calls', 'plan')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.slow_calls = 0
+        self.plan = None
+
+    def add(self, duration_ms, rows, failed):
+        self.calls += 1
+        self.errors += failed
+        self.rows += rows or 0
+        self.total_ms += duration_ms
+        self.min_ms = duration_ms if self.min_ms is None else min(self.min_ms, duration_ms)
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, duration_ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls."""
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            'sql': self.sql,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.calls if self.calls else 0.0,
+            'min_ms': self.min_ms or 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'histogram': dict(zip(BUCKETS_MS + (float('inf'),), self.buckets)),
+            'slow_calls': self.slow_calls,
+            'plan': self.plan,
+        }
+
+
+def explain(conn, query, params=()):
+    """Returns the EXPLAIN QUERY PLAN of a statement as a list of plan lines."""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+    # Rows are (id, parent, notused, detail); indent each step under its parent
+    depth = {0: 0}
+    plan = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, 0) + 1
+        plan.append('  ' * (depth[node] - 1) + detail)
+    return plan
+
+
+def _rowcount(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return None
+
+
+class Profiler:
+    """In-process registry of per-statement latency, like pg_stat_statements.
+
+    Decorated calls are grouped by the normalized text of their `query`
+    argument. Functions without one but taking an sqlite3 connection first
+    are grouped by the statements they run on it. A call taking at least
+    slow_ms milliseconds is counted as slow, and the first time a statement
+    is slow its EXPLAIN QUERY PLAN is captured on the same connection.
+    """
+
+    def __init__(self, slow_ms=100):
+        self.slow_ms = slow_ms
+        self._statements = {}
+        self._lock = threading.Lock()
+
+    def profile(self, func):
+        """Decorator timing each call of func into this registry."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            conn = args[0] if args and isinstance(args[0], sqlite3.Connection) else None
+            query, params, _ = query_and_params(args[1:] if conn else args, kwargs)
+            if query is None and conn is not None:
+                with traced_statements(conn) as statements:
+                    return self._measure(func, args, kwargs, conn, statements=statements)
+            return self._measure(func, args, kwargs, conn, query, params)
+        return wrapper
+
+    def _measure(self, func, args, kwargs, conn, query=None, params=None, statements=None):
+        failed = True
+        result = None
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if query is not None:
+                sql = normalize_sql(query)
+            elif statements:
+                sql = '; '.join(dict.fromkeys(map(normalize_sql, statements)))
+            else:
+                sql = f'<{func.__qualname__}>'
+            self.record(sql, duration_ms, _rowcount(result), failed)
+            if duration_ms >= self.slow_ms:
+                self._flag_slow(sql, conn, query, params)
+
+    def record(self, sql, duration_ms, rows=None, failed=False):
+        """Adds one execution of the (already normalized) statement sql."""
+        with self._lock:
+            stats = self._statements.get(sql)
+            if stats is None:
+                stats = self._statements[sql] = StatementStats(sql)
+            stats.add(duration_ms, rows, failed)
+
+    def _flag_slow(self, sql, conn, query, params):
+        with self._lock:
+            stats = self._statements[sql]
+            stats.slow_calls += 1
+            needs_plan = stats.plan is None and conn is not None and query is not None
+        if not needs_plan:
+            return
+        try:
+            plan = explain(conn, query, params)
+        except sqlite3.Error as error:
+            plan = [f'EXPLAIN QUERY PLAN failed: {error}']
+        with self._lock:
+            stats.plan = plan
+
+    def report(self, top=10, by='total_ms'):
+        """Returns the `top` statements ordered by one of their stats, highest first."""
+        with self._lock:
+            rows = [stats.as_dict() for stats in self._statements.values()]
+        rows.sort(key=lambda row: row[by], reverse=True)
+        return rows[:top]
+
+    def format_report(self, top=10, by='total_ms'):
+        """Renders report() as text, with the plans of the slow statements."""
+        lines = [f"{'calls':>7} {'total ms':>10} {'mean ms':>9} {'p95 ms':>8} "
+                 f"{'max ms':>9} {'slow':>5}  statement"]
+        for row in self.report(top, by):
+            lines.append(
+                f"{row['calls']:>7} {row['total_ms']:>10.2f} {row['mean_ms']:>9.3f} "
+                f"{row['p95_ms']:>8.2f} {row['max_ms']:>9.2f} {row['slow_calls']:>5}  {row['sql']}"
+            )
+            for step in row['plan'] or ():
+                lines.append(f"{'':>53}  | {step}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+
+
+# Shared registry used by the module-level decorator
+profiler = Profiler()
+
+
+def profile_queries(func=None, *, registry=None):
+    """Decorator recording func's query latencies in `registry` (default: profiler).
+
+    Usable bare (@profile_queries) or with a registry
+    (@profile_queries(registry=Profiler(slow_ms=10))).
+    """
+    if func is None:
+        return functools.partial(profile_queries, registry=registry)
+    return (registry or profiler).profile(func)
@@ -0,0 +1,236 @@
+import asyncio
+import functools
+import inspect
+import random
+import sqlite3
+import threading
+import time
+
+# sqlite3 reports lock contention as OperationalError with one of these messages
+_TRANSIENT_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_retryable(error):
+    """True for errors a later attempt can succeed on: lock contention and timeouts."""
+    if isinstance(error, sqlite3.OperationalError):
+        message = str(error).lower()
+        return any(text in message for text in _TRANSIENT_MESSAGES)
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt, base=0.1, cap=5.0):
+    """Full-jitter delay before retry number `attempt` (1 for the first retry).
+
+    The delay is drawn uniformly from [0, min(cap, base * 2**(attempt - 1))],
+    so workers that failed together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling through while a CircuitBreaker is open."""
+
+
+class RetryBudget:
+    """Process-wide limit on retries, as a fraction of calls that succeed.
+
+    Each success adds `ratio` tokens and each retry spends one, up to
+    `max_tokens`. Retries are refused while fewer than half the tokens
+    are left, so when most calls fail, retries stop adding load instead
+    of multiplying it.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        """Takes one retry out of the budget; False if it is exhausted."""
+        with self._lock:
+            if self._tokens - 1 < self.max_tokens / 2:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+
+class CircuitBreaker:
+    """Fails calls fast after `threshold` consecutive retryable failures.
+
+    Once open, calls raise CircuitOpenError for `reset_timeout` seconds.
+    After that a single trial call goes through: success closes the
+    breaker, failure opens it again, and a trial that ends any other way
+    (see end_trial) lets the next call try instead.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=5.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go through now.
+
+        Returns True if the call is the half-open trial, which must then
+        end with record_success, record_failure or end_trial.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial:
+                raise CircuitOpenError(
+                    f"Circuit open after {self._failures} consecutive failures"
+                )
+            self._trial = True
+            return True
+
+    def end_trial(self):
+        """Clears a trial call that neither succeeded nor failed, e.g. one cancelled."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+# Shared by every decorated function unless one is given its own
+default_budget = RetryBudget()
+default_breaker = CircuitBreaker()
+
+
+class _Policy:
+    """The retry decision shared by the sync and async wrappers."""
+
+    def __init__(self, retries, delay, max_delay, retryable, budget, breaker, verbose):
+        self.retries = retries
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.budget = budget
+        self.breaker = breaker
+        self.verbose = verbose
+
+    def before_call(self, last_error=None):
+        """Asks the breaker; returns True if this call is its half-open trial."""
+        if self.breaker is None:
+            return False
+        try:
+            return self.breaker.before_call()
+        except CircuitOpenError as error:
+            if last_error is None:
+                raise
+            # Opened by the failures of this very call: keep the real cause
+            raise error from last_error
+
+    def end_trial(self):
+        self.breaker.end_trial()
+
+    def succeeded(self):
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self.budget is not None:
+            self.budget.record_success()
+
+    def failed(self, attempt, error):
+        """Returns the delay before the next attempt, or re-raises error."""
+        if not self.retryable(error):
+            # The database answered, so the circuit is healthy
+            if self.breaker is not None:
+                self.breaker.record_success()
+            raise error
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if attempt >= self.retries or (self.budget is not None and not self.budget.try_spend()):
+            raise error
+        delay = backoff_delay(attempt, self.delay, self.max_delay)
+        if self.verbose:
+            print(f"Attempt {attempt} failed, retrying in {delay:.2f} seconds...")
+        return delay
+
+
+def retry_on_failure(retries=3, delay=0.1, max_delay=5.0, retryable=is_retryable,
+                     budget=default_budget, breaker=default_breaker, verbose=False):
+    """Decorator factory retrying transient failures with jittered exponential backoff.
+
+    Makes at most `retries` attempts. Only errors for which retryable(error)
+    is true are retried, after a backoff_delay(attempt, delay, max_delay)
+    pause, and only while the shared RetryBudget allows. The CircuitBreaker
+    sees every retryable failure. Pass budget=None or breaker=None to opt
+    out of either. Coroutine functions are retried with asyncio.sleep, so
+    waiting never blocks the event loop.
+    """
+    policy = _Policy(retries, delay, max_delay, retryable, budget, breaker, verbose)
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                last_error = None
+                for attempt in range(1, retries + 1):
+                    trial = policy.before_call(last_error)
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as error:
+                        last_error = error
+                        pause = policy.failed(attempt, error)
+                    else:
+                        policy.succeeded()
+                        return result
+                    finally:
+                        if trial:
+                            policy.end_trial()
+                    await asyncio.sleep(pause)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            last_error = None
+            for attempt in range(1, retries + 1):
+                trial = policy.before_call(last_error)
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as error:
+                    last_error = error
+                    pause = policy.failed(attempt, error)
+                else:
+                    policy.succeeded()
+                    return result
+                finally:
+                    # Frees the half-open slot however the trial ended,
+                    # including KeyboardInterrupt or cancellation
+                    if trial:
+                        policy.end_trial()
+                time.sleep(pause)
+        return wrapper
+    return decorator
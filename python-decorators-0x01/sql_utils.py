@@ -0,0 +1,194 @@
+import contextlib
+import re
+import threading
+
+# A table name, optionally schema-qualified: groups are (schema, table)
+_TABLE = r"(?:[`\"\[]?(\w+)[`\"\]]?\s*\.\s*)?[`\"\[]?(\w+)[`\"\]]?"
+_WRITE = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?"
+    r"|DELETE\s+FROM)\s+" + _TABLE,
+    re.IGNORECASE,
+)
+# Statements that may change what cached reads return
+_CHANGING = re.compile(r"^\s*(INSERT|REPLACE|UPDATE|DELETE|WITH|DROP|ALTER)\b", re.IGNORECASE)
+_DML_WORD = re.compile(r"\b(?:INSERT|REPLACE|UPDATE|DELETE)\b", re.IGNORECASE)
+# A FROM/JOIN table, and whether a comma join follows it (after an optional alias)
+_READ = re.compile(
+    r"\b(?:FROM|JOIN)\s+" + _TABLE + r"(?P<comma>\s*(?:(?:AS\s+)?\w+\s*)?,)?",
+    re.IGNORECASE,
+)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_LITERAL = re.compile(
+    r"'(?:[^']|'')*'"                                 # string literal
+    r"|\b[xX]'[0-9a-fA-F]*'"                          # blob literal
+    r"|\?\d*|[:@$]\w+"                                # placeholder
+    r"|(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b"  # number
+)
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# Whitespace runs, and the quoted text and comments whose spacing must be kept
+_SPACING = re.compile(
+    r"(?P<kept>'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|/\*.*?\*/)"
+    r"|(?P<line_comment>--[^\n]*)"
+    r"|\s+",
+    re.DOTALL,
+)
+
+
+def tables_written(sql):
+    """Returns the (lowercased) table a statement writes to, as a set.
+
+    The set is empty for statements that write nothing, and None when the
+    statement changes something this cannot pin down (an unparsed write
+    target, DROP, ALTER), meaning every cached read may be stale.
+    """
+    # String contents must not be mistaken for keywords
+    sql = _STRING.sub("''", sql or '')
+    verb = _CHANGING.match(sql)
+    if verb is None:
+        return set()
+    keyword = verb.group(1).upper()
+    if keyword in ('DROP', 'ALTER'):
+        return None
+    if keyword == 'WITH' and not _DML_WORD.search(sql):
+        return set()
+    match = _WRITE.search(sql)
+    return {match.group(2).lower()} if match else None
+
+
+def tables_written_by(statements):
+    """Union of tables_written() over statements; None if any of them is unknown."""
+    written = set()
+    for statement in statements:
+        tables = tables_written(statement)
+        if tables is None:
+            return None
+        written |= tables
+    return written
+
+
+def tables_read(sql):
+    """Returns the (lowercased) tables named after FROM or JOIN in a statement.
+
+    Returns None when the list may be incomplete: comma joins and
+    schema-qualified names are not followed, so such a read should be
+    invalidated by any write.
+    """
+    tables = set()
+    for match in _READ.finditer(_STRING.sub("''", sql or '')):
+        if match.group(1) is not None or match.group('comma') is not None:
+            return None
+        tables.add(match.group(2).lower())
+    return tables
+
+
+def query_and_params(args, kwargs):
+    """Finds the query and params a decorated call was given.
+
+    args are the positional arguments after the connection. The query is
+    the `query` keyword, or else the first positional argument if it is a
+    string, in which case params may follow it; params is otherwise the
+    `params` keyword. Returns (query, params, taken), where either may be
+    None and taken counts the positional arguments they came from.
+    """
+    query = kwargs.get('query')
+    params = kwargs.get('params')
+    taken = 0
+    if query is None and args and isinstance(args[0], str):
+        query = args[0]
+        taken = 1
+        if params is None and len(args) > 1:
+            params = args[1]
+            taken = 2
+    return query, params, taken
+
+
+def normalize_sql(sql):
+    """Reduces a statement to its shape: literals and placeholders become ?.
+
+    Statements differing only in their values (or in the length of an IN
+    list) normalize to the same text, so they can be grouped together.
+    """
+    sql = _LITERAL.sub('?', sql or '')
+    sql = _IN_LIST.sub('(?)', sql)
+    return ' '.join(sql.split()).rstrip(';')
+
+
+def compact_sql(sql):
+    """Collapses each run of whitespace in a statement to one space.
+
+    Unlike ' '.join(sql.split()), string literals, quoted identifiers and
+    comments are left as they are, so statements that differ inside them
+    stay different.
+    """
+    return _SPACING.sub(_compact_token, sql).strip()
+
+
+def _compact_token(match):
+    if match.group('kept') is not None:
+        return match.group()
+    if match.group('line_comment') is not None:
+        # The comment still has to end where it did
+        return match.group() + '\n'
+    return ' '
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def traced_statements(conn):
+    """Collects every SQL statement executed on conn inside the block.
+
+    Built on sqlite3's set_trace_callback, which allows a single callback
+    per connection, so nested blocks on the same connection share one
+    dispatching callback instead of replacing each other's.
+    """
+    statements = []
+    install = _add_listener(conn, statements.append)
+    if install is not None:
+        conn.set_trace_callback(install)
+    try:
+        yield statements
+    finally:
+        if _remove_listener(conn, statements.append):
+            conn.set_trace_callback(None)
+
+
+@contextlib.asynccontextmanager
+async def traced_statements_async(conn):
+    """traced_statements for an aiosqlite connection."""
+    statements = []
+    install = _add_listener(conn, statements.append)
+    if install is not None:
+        await conn.set_trace_callback(install)
+    try:
+        yield statements
+    finally:
+        if _remove_listener(conn, statements.append):
+            await conn.set_trace_callback(None)
+
+
+def _add_listener(conn, listener):
+    """Registers listener; returns the callback to install if conn had none."""
+    key = id(conn)
+    with _listeners_lock:
+        listeners = _listeners.get(key)
+        install = None
+        if listeners is None:
+            listeners = _listeners[key] = []
+            install = lambda sql: [notify(sql) for notify in list(listeners)]
+        listeners.append(listener)
+    return install
+
+
+def _remove_listener(conn, listener):
+    """Unregisters listener; returns True if the callback should be removed."""
+    key = id(conn)
+    with _listeners_lock:
+        listeners = _listeners[key]
+        listeners.remove(listener)
+        if listeners:
+            return False
+        del _listeners[key]
+        return True
@@ -0,0 +1,249 @@
+import collections
+import functools
+import re
+import sqlite3
+import threading
+
+from retry import is_retryable
+from sql_utils import query_and_params
+
+# Tokens parameterize() looks at. Strings, quoted identifiers and comments
+# are matched whole so nothing inside them is mistaken for a literal. The
+# lookahead lets the scan skip every other character without trying each
+# alternative on it.
+_TOKEN = re.compile(
+    r"(?=['\"`\[\-/?:@$\dxX])(?:"
+    r"(?P<string>'(?:[^']|'')*')"
+    r"|(?P<blob>\b[xX]'[0-9a-fA-F]*')"
+    r"|(?P<quoted>\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])"
+    r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<placeholder>\?\d*|[:@$]\w+)"
+    r"|(?P<number>(?<![\w.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b))",
+    re.DOTALL,
+)
+# ORDER BY / GROUP BY lists, where a bare number is a column position
+_ORDINAL_CLAUSE = re.compile(
+    r"\b(?:ORDER|GROUP)\s+BY\b.*?"
+    r"(?=\b(?:LIMIT|HAVING|WINDOW|UNION|EXCEPT|INTERSECT)\b|[;)]|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+# What follows AS and must stay literal: a quoted alias, or the arguments
+# of a type name as in CAST(x AS VARCHAR(255)) or CAST(x AS DECIMAL(10, 2))
+_AFTER_AS = re.compile(
+    r"\bAS\s+(?:'(?:[^']|'')*'|\w+(?:\s+\w+)?\s*\([^()]*\))",
+    re.IGNORECASE,
+)
+# Only these statements take bound parameters; DDL and PRAGMAs are left alone
+_DML = re.compile(r"^\s*(?:SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.IGNORECASE)
+
+
+def _kept_spans(query):
+    """Spans whose literals are not values: ORDER/GROUP BY lists and AS targets."""
+    spans = []
+    if 'by' in query or 'BY' in query or 'By' in query:
+        spans.extend(match.span() for match in _ORDINAL_CLAUSE.finditer(query))
+    if 'as' in query or 'AS' in query or 'As' in query:
+        spans.extend(match.span() for match in _AFTER_AS.finditer(query))
+    return spans
+
+
+# Marks where parameterize() puts a value passed in by the caller
+_GIVEN = object()
+
+
+@functools.lru_cache(maxsize=4096)
+def _template(query, named):
+    """Scans query once; returns (sql, slots) or None if it has no literals.
+
+    slots lists, in placeholder order, either a literal's value or _GIVEN
+    for a placeholder already in the query. Cached by text, so repeats of
+    the same statement skip the scan.
+    """
+    if not _DML.match(query):
+        return None
+    kept = _kept_spans(query)
+    parts = []
+    slots = []
+    position = 0
+    for match in _TOKEN.finditer(query):
+        kind = match.lastgroup
+        if kind == 'placeholder':
+            if not named:
+                slots.append(_GIVEN)
+            continue
+        if kind not in ('string', 'blob', 'number'):
+            continue
+        if any(start <= match.start() < end for start, end in kept):
+            continue
+        text = match.group()
+        if kind == 'string':
+            value = text[1:-1].replace("''", "'")
+        elif kind == 'blob':
+            value = bytes.fromhex(text[2:-1])
+        else:
+            value = float(text) if any(c in text for c in '.eE') else int(text)
+        parts.append(query[position:match.start()])
+        parts.append(f':_p{len(slots)}' if named else '?')
+        slots.append(value)
+        position = match.end()
+    if position == 0:
+        return None
+    parts.append(query[position:])
+    return ''.join(parts), tuple(slots)
+
+
+def parameterize(query, params=None):
+    """Moves the literal values of a statement into bind parameters.
+
+    Returns (sql, params) where every string, number and blob literal in
+    query is a placeholder and its value is in params, merged in order
+    with any params already given. Statements differing only in their
+    values then share one SQL text, and so one prepared statement.
+    Column numbers in ORDER BY / GROUP BY are kept, as a parameter there
+    would sort by a constant, and so are quoted aliases and type arguments
+    after AS, where SQL does not accept a parameter.
+    """
+    named = isinstance(params, dict)
+    template = _template(query, named)
+    if template is None:
+        return query, params
+    sql, slots = template
+    if named:
+        values = dict(params)
+        values.update((f'_p{number}', value) for number, value in enumerate(slots))
+        return sql, values
+    given = iter(params or ())
+    return sql, [next(given) if value is _GIVEN else value for value in slots]
+
+
+class StatementCache:
+    """Mirror of one connection's prepared-statement cache, for hit-rate stats.
+
+    sqlite3 keeps the last `size` distinct SQL texts prepared per
+    connection (its cached_statements) and reuses them only on an exact
+    text match. Tracking the same LRU here tells whether an execute
+    reused a prepared statement or had to parse the SQL again.
+    """
+
+    def __init__(self, size=128):
+        self.size = size
+        self._statements = collections.OrderedDict()
+
+    def touch(self, sql):
+        """Records an execute of sql; True if it was already prepared."""
+        if sql in self._statements:
+            self._statements.move_to_end(sql)
+            return True
+        self._statements[sql] = None
+        if len(self._statements) > self.size:
+            self._statements.popitem(last=False)
+        return False
+
+
+# sqlite3 connections cannot be weakly referenced, so caches are kept by
+# id() for the most recently used connections only
+MAX_CONNECTIONS = 64
+_caches = collections.OrderedDict()
+_stats = collections.Counter()
+_lock = threading.Lock()
+# Queries whose parameterized form SQLite refused to prepare; run as written
+MAX_REJECTED = 4096
+_rejected = set()
+# Parameterized SQL texts SQLite has prepared once already
+MAX_VERIFIED = 4096
+_verified = set()
+
+
+def _record(conn, sql, size):
+    with _lock:
+        key = id(conn)
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = StatementCache(size)
+            if len(_caches) > MAX_CONNECTIONS:
+                _caches.popitem(last=False)
+        else:
+            _caches.move_to_end(key)
+        _stats['hits' if cache.touch(sql) else 'misses'] += 1
+
+
+def stats():
+    """Returns statement cache hits, misses and hit rate across all connections."""
+    with _lock:
+        hits, misses, fallbacks = _stats['hits'], _stats['misses'], _stats['fallbacks']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'fallbacks': fallbacks,
+        'hit_rate': hits / lookups if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+        _caches.clear()
+
+
+def _reject(query):
+    with _lock:
+        if len(_rejected) >= MAX_REJECTED:
+            _rejected.clear()
+        _rejected.add(query)
+        _stats['fallbacks'] += 1
+
+
+def _verify(sql):
+    with _lock:
+        if len(_verified) >= MAX_VERIFIED:
+            _verified.clear()
+        _verified.add(sql)
+
+
+def _prepares(conn, sql, params):
+    """True if SQLite can prepare sql; EXPLAIN compiles it without running it."""
+    try:
+        conn.execute("EXPLAIN " + sql, params or ()).close()
+    except sqlite3.OperationalError as error:
+        if is_retryable(error):
+            raise
+        return False
+    return True
+
+
+def prepared(func=None, *, size=128):
+    """Decorator parameterizing the query of func(conn, query, params=None).
+
+    func is called with the parameterized SQL and its params (as keyword
+    arguments), so literal values no longer defeat the connection's
+    statement cache. `size` should match the connection's
+    cached_statements (128 for SQLitePool's connections) for stats() to
+    reflect its hit rate. Each new rewritten statement is prepared once
+    before func runs; should SQLite refuse it where it accepts the query
+    as written (a literal where it takes no parameter), the query is run
+    as written, now and from then on. func itself is only ever called once.
+    """
+    if func is None:
+        return functools.partial(prepared, size=size)
+
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        query, params, taken = query_and_params(args, kwargs)
+        args = args[taken:]
+        kwargs.pop('query', None)
+        kwargs.pop('params', None)
+        if query in _rejected:
+            sql, bound = query, params
+        else:
+            sql, bound = parameterize(query, params)
+        if sql is not query and sql not in _verified:
+            if _prepares(conn, sql, bound):
+                _verify(sql)
+            elif _prepares(conn, query, params):
+                _reject(query)
+                sql, bound = query, params
+            # Otherwise the query is broken either way; func reports it
+        _record(conn, sql, size)
+        return func(conn, *args, query=sql, params=bound or (), **kwargs)
+    return wrapper
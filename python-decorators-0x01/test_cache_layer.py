@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+test_cache_layer module
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from cache_layer import AsyncSingleFlight, QueryCache, SQLiteBackend
+
+
+class TestSQLiteBackendContention(unittest.TestCase):
+    """Tests for invalidations that find the shared cache file locked"""
+
+    def setUp(self):
+        """Fills a file-backed cache and locks the file from another connection"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'cache.sqlite')
+        backend = SQLiteBackend(path)
+        self.addCleanup(backend.close)
+        self.cache = QueryCache(backend=backend)
+        self.cache.set('users', [1], tables={'users'})
+        self.cache.set('orders', [2], tables={'orders'})
+        self.other = sqlite3.connect(path, isolation_level=None)
+        self.addCleanup(self.other.close)
+        self.other.execute("BEGIN IMMEDIATE")
+
+    def test_locked_invalidation_does_not_raise(self):
+        """Test that an invalidation gives up quickly instead of failing the write"""
+        started = time.monotonic()
+        self.cache.invalidate_tables({'users'})
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_reads_miss_until_invalidation_applies(self):
+        """Test that a pending invalidation hides entries until it gets through"""
+        self.cache.invalidate_tables({'users'})
+        self.assertEqual(self.cache.lookup('users'), ('miss', None))
+        self.other.execute("ROLLBACK")
+        self.assertNotIn('users', self.cache)
+        self.assertEqual(self.cache.lookup('orders'), ('fresh', [2]))
+
+    def test_pending_clear(self):
+        """Test that a locked invalidation of every table empties the cache later"""
+        self.cache.invalidate_tables(None)
+        self.other.execute("ROLLBACK")
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestAsyncSingleFlightCancellation(unittest.IsolatedAsyncioTestCase):
+    """Tests for a shared call whose leader is cancelled"""
+
+    async def test_waiter_takes_over(self):
+        """Test that a waiter runs the call itself instead of being cancelled"""
+        flight = AsyncSingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        async def fast():
+            return 'loaded'
+
+        leader = asyncio.create_task(flight.do('key', slow))
+        await started.wait()
+        waiters = [asyncio.create_task(flight.do('key', fast)) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await asyncio.gather(*waiters), ['loaded', 'loaded'])
+        self.assertTrue(leader.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
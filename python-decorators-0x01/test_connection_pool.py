@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+test_connection_pool module
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from connection_pool import SQLitePool
+
+
+class TestSQLitePoolClose(unittest.TestCase):
+    """Tests for connections released after the pool is closed"""
+
+    def setUp(self):
+        """Creates a pool on a temporary database"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.pool = SQLitePool(os.path.join(directory.name, 'x.db'), max_size=2)
+        self.addCleanup(self.pool.close)
+
+    def test_release_after_close_closes(self):
+        """Test that a connection in use during close() is closed on release"""
+        conn = self.pool.acquire()
+        self.pool.close()
+        self.pool.release(conn)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        self.assertEqual(self.pool._opened, 0)
+        self.assertTrue(self.pool._idle.empty())
+
+    def test_release_before_close_reuses(self):
+        """Test that an open pool takes released connections back"""
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        self.assertIs(self.pool.acquire(), conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
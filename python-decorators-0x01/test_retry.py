@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+test_retry module
+"""
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+from retry import CircuitBreaker, CircuitOpenError, retry_on_failure
+
+
+def locked():
+    """Raises the error sqlite3 reports under lock contention"""
+    raise sqlite3.OperationalError("database is locked")
+
+
+class TestCircuitBreakerHalfOpen(unittest.TestCase):
+    """Tests for the trial call a half-open CircuitBreaker lets through"""
+
+    def setUp(self):
+        """Opens a breaker and moves the clock past its reset timeout"""
+        self.now = 100.0
+        clock = patch('retry.time.monotonic', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.breaker = CircuitBreaker(threshold=1, reset_timeout=5.0)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.now += 5.0
+        self.assertEqual(self.breaker.state, 'half-open')
+
+    def decorate(self, func, retries=1):
+        """Wraps func with a retry policy using this test's breaker"""
+        return retry_on_failure(retries=retries, delay=0, budget=None,
+                                breaker=self.breaker)(func)
+
+    def test_successful_trial_closes(self):
+        """Test that a successful trial closes the breaker"""
+        self.assertEqual(self.decorate(lambda: 42)(), 42)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_failed_trial_reopens(self):
+        """Test that a retryable failure of the trial opens the breaker again"""
+        with self.assertRaises(sqlite3.OperationalError):
+            self.decorate(locked)()
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_non_retryable_trial_closes(self):
+        """Test that a non-retryable error counts as the database answering"""
+        def bad_query():
+            raise sqlite3.OperationalError("no such table: users")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.decorate(bad_query)()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.decorate(lambda: 1)(), 1)
+
+    def test_interrupted_trial_frees_slot(self):
+        """Test that a trial ended by a BaseException lets the next call try"""
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.decorate(interrupted)()
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertEqual(self.decorate(lambda: 1)(), 1)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_concurrent_call_rejected_during_trial(self):
+        """Test that only one trial runs while the breaker is half-open"""
+        def trial():
+            with self.assertRaises(CircuitOpenError):
+                self.decorate(lambda: 1)()
+            return 'trial'
+
+        self.assertEqual(self.decorate(trial)(), 'trial')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_open_error_chains_last_failure(self):
+        """Test that opening mid-retries keeps the failure that caused it"""
+        with self.assertRaises(CircuitOpenError) as caught:
+            self.decorate(locked, retries=3)()
+        self.assertIsInstance(caught.exception.__cause__, sqlite3.OperationalError)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+test_sql_utils module
+"""
+import sqlite3
+import unittest
+
+from cache_layer import QueryCache, cached
+from sql_utils import tables_read, tables_written, tables_written_by
+from transactions import transactional
+
+
+class TestTablesRead(unittest.TestCase):
+    """Tests for tables_read"""
+
+    def test_joins(self):
+        """Test that every JOINed table is found"""
+        self.assertEqual(
+            tables_read("SELECT * FROM users JOIN orders ON orders.user_id = users.id"),
+            {'users', 'orders'},
+        )
+
+    def test_comma_join_is_unknown(self):
+        """Test that a comma join makes the list unknown"""
+        self.assertIsNone(tables_read("SELECT * FROM users, orders"))
+        self.assertIsNone(tables_read("SELECT * FROM users u, orders o WHERE u.id = o.id"))
+
+    def test_schema_qualified_is_unknown(self):
+        """Test that a schema-qualified name makes the list unknown"""
+        self.assertIsNone(tables_read("SELECT * FROM main.users"))
+
+    def test_string_contents_ignored(self):
+        """Test that keywords inside string literals are not read as tables"""
+        self.assertEqual(
+            tables_read("SELECT * FROM users WHERE note = 'picked FROM stock, shelf'"),
+            {'users'},
+        )
+
+
+class TestTablesWritten(unittest.TestCase):
+    """Tests for tables_written"""
+
+    def test_cte_insert(self):
+        """Test that the target of an INSERT after a WITH clause is found"""
+        self.assertEqual(
+            tables_written("WITH new AS (SELECT 1 AS id) INSERT INTO users SELECT * FROM new"),
+            {'users'},
+        )
+
+    def test_cte_select_writes_nothing(self):
+        """Test that a WITH ... SELECT is not taken for a write"""
+        self.assertEqual(tables_written("WITH x AS (SELECT 1) SELECT * FROM x"), set())
+
+    def test_schema_qualified_target(self):
+        """Test that main.users resolves to users"""
+        self.assertEqual(tables_written("UPDATE main.users SET age = 1"), {'users'})
+
+    def test_unknown_changes(self):
+        """Test that schema changes and unparsed writes are unknown"""
+        self.assertIsNone(tables_written("DROP TABLE users"))
+        self.assertIsNone(tables_written_by(["SELECT 1", "ALTER TABLE users ADD x"]))
+
+    def test_reads_write_nothing(self):
+        """Test that reads and transaction control write nothing"""
+        self.assertEqual(tables_written_by(["BEGIN", "SELECT * FROM users", "COMMIT"]), set())
+
+
+class TestInvalidation(unittest.TestCase):
+    """Tests for cached reads invalidated by transactional writes"""
+
+    def setUp(self):
+        """Creates two tables and a cached reader"""
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        self.conn.execute("CREATE TABLE users (id INTEGER)")
+        self.conn.execute("CREATE TABLE orders (user_id INTEGER)")
+        self.addCleanup(self.conn.close)
+        self.cache = QueryCache(ttl=None)
+
+        @cached(self.cache)
+        def read(conn, query):
+            return conn.execute(query).fetchall()
+        self.read = read
+
+    def write(self, sql):
+        """Runs sql in a transactional call"""
+        transactional(lambda conn: conn.execute(sql))(self.conn)
+
+    def test_comma_join_invalidated_by_either_table(self):
+        """Test that a write to the second table of a comma join invalidates it"""
+        query = "SELECT * FROM users, orders"
+        self.assertEqual(self.read(self.conn, query), [])
+        self.write("INSERT INTO users VALUES (1)")
+        self.write("INSERT INTO orders VALUES (1)")
+        self.assertEqual(self.read(self.conn, query), [(1, 1)])
+
+    def test_cte_write_invalidates(self):
+        """Test that a WITH ... INSERT invalidates its target"""
+        query = "SELECT * FROM users"
+        self.assertEqual(self.read(self.conn, query), [])
+        self.write("WITH new AS (SELECT 7 AS id) INSERT INTO users SELECT id FROM new")
+        self.assertEqual(self.read(self.conn, query), [(7,)])
+
+    def test_unknown_write_invalidates_everything(self):
+        """Test that a schema change empties the cache"""
+        self.read(self.conn, "SELECT * FROM users")
+        self.read(self.conn, "SELECT * FROM orders")
+        self.write("ALTER TABLE orders ADD COLUMN total INTEGER")
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+test_statement_cache module
+"""
+import sqlite3
+import unittest
+
+import statement_cache
+from statement_cache import prepared
+
+
+class TestPreparedFallback(unittest.TestCase):
+    """Tests for queries whose parameterized form SQLite cannot prepare"""
+
+    def setUp(self):
+        """Opens an in-memory database with a data table and a log table"""
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        self.conn.execute("CREATE TABLE t (a INTEGER)")
+        self.conn.execute("CREATE TABLE log (query TEXT)")
+        self.addCleanup(self.conn.close)
+        self.calls = []
+
+        @prepared
+        def run(conn, query, params=None):
+            self.calls.append(query)
+            conn.execute("INSERT INTO log VALUES (?)", (query,))
+            return conn.execute(query, params).fetchall()
+        self.run = run
+
+    def logged(self):
+        """Returns how many rows the decorated function logged"""
+        return self.conn.execute("SELECT COUNT(*) FROM log").fetchone()[0]
+
+    def test_broken_query_runs_once(self):
+        """Test that a query failing for its own reasons is not run again"""
+        query = "SELECT * FROM missing WHERE a = 1"
+        with self.assertRaises(sqlite3.OperationalError):
+            self.run(self.conn, query)
+        self.assertEqual(self.logged(), 1)
+        self.assertNotIn(query, statement_cache._rejected)
+
+    def test_unpreparable_rewrite_runs_as_written(self):
+        """Test that a literal SQLite takes no parameter for keeps the query as written"""
+        query = "SELECT a 'total' FROM t WHERE a = 1"
+        self.assertEqual(self.run(self.conn, query), [])
+        self.assertEqual(self.calls, [query])
+        self.assertIn(query, statement_cache._rejected)
+
+    def test_rewrite_is_used(self):
+        """Test that a query that prepares fine runs parameterized"""
+        self.assertEqual(self.run(self.conn, "SELECT a FROM t WHERE a = 1"), [])
+        self.assertEqual(self.calls, ["SELECT a FROM t WHERE a = ?"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+test_transactions module
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from transactions import GroupCommitter, transactional
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+
+@unittest.skipIf(aiosqlite is None, "aiosqlite is not installed")
+class TestAsyncTransactional(unittest.IsolatedAsyncioTestCase):
+    """Tests for transactional coroutines sharing one aiosqlite connection"""
+
+    async def asyncSetUp(self):
+        """Opens an in-memory database with an empty table"""
+        self.conn = await aiosqlite.connect(':memory:', isolation_level=None)
+        await self.conn.execute("CREATE TABLE t (v INTEGER)")
+
+    async def asyncTearDown(self):
+        """Closes the connection"""
+        await self.conn.close()
+
+    async def rows(self):
+        """Returns the values in the table, in order"""
+        cursor = await self.conn.execute("SELECT v FROM t ORDER BY v")
+        return [row[0] for row in await cursor.fetchall()]
+
+    async def test_interleaved_failure_rolls_back_alone(self):
+        """Test that a failing task's write is not committed by another task"""
+        @transactional
+        async def failing(conn):
+            await conn.execute("INSERT INTO t VALUES (1)")
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        @transactional
+        async def succeeding(conn):
+            await conn.execute("INSERT INTO t VALUES (2)")
+
+        results = await asyncio.gather(
+            failing(self.conn), succeeding(self.conn), return_exceptions=True
+        )
+        self.assertIsInstance(results[0], ValueError)
+        self.assertIsNone(results[1])
+        self.assertEqual(await self.rows(), [2])
+
+    async def test_nested_call_uses_savepoint(self):
+        """Test that a failing nested call undoes only its own write"""
+        @transactional
+        async def inner(conn, value):
+            await conn.execute("INSERT INTO t VALUES (?)", (value,))
+            if value < 0:
+                raise ValueError("negative")
+
+        @transactional
+        async def outer(conn):
+            await inner(conn, 1)
+            with self.assertRaises(ValueError):
+                await inner(conn, -1)
+
+        await outer(self.conn)
+        self.assertEqual(await self.rows(), [1])
+
+    async def test_cancelled_transaction_rolls_back(self):
+        """Test that cancelling a task leaves no transaction open"""
+        started = asyncio.Event()
+
+        @transactional
+        async def slow(conn):
+            await conn.execute("INSERT INTO t VALUES (3)")
+            started.set()
+            await asyncio.sleep(10)
+
+        task = asyncio.create_task(slow(self.conn))
+        await started.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(self.conn.in_transaction)
+        self.assertEqual(await self.rows(), [])
+
+
+class TestGroupCommitterFailure(unittest.TestCase):
+    """Tests for calls made after the GroupCommitter writer thread dies"""
+
+    def test_unopenable_database_fails_calls(self):
+        """Test that a database the writer can't open fails calls instead of hanging"""
+        committer = GroupCommitter('/nonexistent/x.db')
+        with self.assertRaises(Exception) as caught:
+            committer.submit(lambda conn: 1).result(timeout=5)
+        self.assertIsInstance(caught.exception, sqlite3.OperationalError)
+        committer._thread.join(timeout=5)
+        with self.assertRaises(RuntimeError):
+            committer.call(lambda conn: 1)
+
+    def test_interrupted_call_fails_group(self):
+        """Test that a call raising a BaseException fails its group and the queue"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        committer = GroupCommitter(os.path.join(directory.name, 'x.db'), max_delay=0.05)
+        self.addCleanup(committer.close)
+
+        def interrupted(conn):
+            raise KeyboardInterrupt
+
+        futures = [committer.submit(lambda conn: 1), committer.submit(interrupted)]
+        for future in futures:
+            with self.assertRaises(KeyboardInterrupt):
+                future.result(timeout=5)
+        committer._thread.join(timeout=5)
+        with self.assertRaises(RuntimeError):
+            committer.submit(lambda conn: 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
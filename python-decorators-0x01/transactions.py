@@ -0,0 +1,308 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import inspect
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+
+import connection_pool
+from cache_layer import invalidate_tables
+from sql_utils import tables_written_by, traced_statements, traced_statements_async
+
+# Depth of the transactional() blocks currently open on each connection
+_depths = {}
+_depths_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _nesting(conn):
+    """Tracks how deeply transactional blocks are nested on conn; yields the depth."""
+    key = id(conn)
+    with _depths_lock:
+        depth = _depths[key] = _depths.get(key, 0) + 1
+    try:
+        yield depth
+    finally:
+        with _depths_lock:
+            if depth == 1:
+                del _depths[key]
+            else:
+                _depths[key] = depth - 1
+
+
+# The same for coroutines, per task: each task sees only its own blocks, and
+# tasks it starts inherit a snapshot rather than sharing one counter
+_async_depths = contextvars.ContextVar('transactional_depths', default={})
+# One outermost transaction at a time per aiosqlite connection: tasks sharing
+# a connection would otherwise commit or roll back each other's writes
+_async_locks = weakref.WeakKeyDictionary()
+
+
+def _async_lock(conn):
+    lock = _async_locks.get(conn)
+    if lock is None:
+        lock = _async_locks[conn] = asyncio.Lock()
+    return lock
+
+
+@contextlib.contextmanager
+def _async_nesting(conn):
+    """_nesting for the current task; yields the depth."""
+    depths = _async_depths.get()
+    depth = depths.get(id(conn), 0) + 1
+    token = _async_depths.set({**depths, id(conn): depth})
+    try:
+        yield depth
+    finally:
+        _async_depths.reset(token)
+
+
+@contextlib.contextmanager
+def savepoint(conn, name):
+    """Runs the block inside SAVEPOINT name; an error rolls back just the block."""
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+@contextlib.asynccontextmanager
+async def savepoint_async(conn, name):
+    """savepoint for an aiosqlite connection."""
+    await conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except BaseException:
+        await conn.execute(f"ROLLBACK TO {name}")
+        await conn.execute(f"RELEASE {name}")
+        raise
+    await conn.execute(f"RELEASE {name}")
+
+
+def _async_transactional(func):
+    @functools.wraps(func)
+    async def wrapper(conn, *args, **kwargs):
+        with _async_nesting(conn) as depth:
+            if depth > 1:
+                async with savepoint_async(conn, f"transactional_{depth}"):
+                    return await func(conn, *args, **kwargs)
+            async with _async_lock(conn):
+                try:
+                    async with traced_statements_async(conn) as statements:
+                        if not conn.in_transaction:
+                            await conn.execute("BEGIN")
+                        result = await func(conn, *args, **kwargs)
+                        await conn.commit()
+                except BaseException:
+                    # Cancellation too: the next task must not inherit it open
+                    await conn.rollback()
+                    raise
+        invalidate_tables(tables_written_by(statements))
+        return result
+    return wrapper
+
+
+def transactional(func):
+    """Runs func(conn, ...) in a transaction, committed when it returns.
+
+    The outermost call commits (or rolls back on error) and then
+    invalidates cached reads of the tables it wrote. A call nested inside
+    another on the same connection runs in a savepoint instead, so its
+    failure undoes only its own writes and leaves the outer transaction
+    to decide. Coroutine functions are given the same behaviour on an
+    aiosqlite connection, where tasks sharing the connection take turns:
+    one task's outermost transaction ends before another's begins.
+    """
+    if inspect.iscoroutinefunction(func):
+        return _async_transactional(func)
+
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        with _nesting(conn) as depth:
+            if depth > 1:
+                with savepoint(conn, f"transactional_{depth}"):
+                    return func(conn, *args, **kwargs)
+            try:
+                with traced_statements(conn) as statements:
+                    # Begin explicitly, so the savepoints of nested calls are
+                    # part of this transaction rather than committing on release
+                    if not conn.in_transaction:
+                        conn.execute("BEGIN")
+                    result = func(conn, *args, **kwargs)
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        # Cached reads of the tables written here are stale from now on
+        invalidate_tables(tables_written_by(statements))
+        return result
+    return wrapper
+
+
+class _Job:
+    __slots__ = ('func', 'args', 'kwargs', 'future')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = concurrent.futures.Future()
+
+
+_STOP = object()
+
+
+class GroupCommitter:
+    """Commits the writes of many calls together, in one transaction per group.
+
+    Calls are queued to a writer thread that owns one connection. It runs
+    up to max_batch of them, waiting at most max_delay seconds after the
+    first for more to arrive, then commits once. Each call runs in its own
+    savepoint: one that raises is rolled back alone and its caller gets
+    the exception, while the rest of the group still commits. Callers get
+    their result only once the group has committed. If the writer thread
+    dies (the database can't be opened, or a call raises KeyboardInterrupt),
+    queued calls fail with its error and later ones raise RuntimeError.
+    """
+
+    def __init__(self, db_name='users.db', max_batch=100, max_delay=0.005, pragmas=None):
+        self.db_name = db_name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pragmas = connection_pool.DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.groups = 0
+        self.calls = 0
+        self._jobs = queue.Queue()
+        # Guards _closed, so no job is queued after the writer stops reading
+        self._lock = threading.Lock()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Queues func(conn, *args, **kwargs); returns a Future resolved on commit."""
+        job = _Job(func, args, kwargs)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("GroupCommitter is closed") from self._error
+            self._jobs.put(job)
+        return job.future
+
+    def call(self, func, *args, **kwargs):
+        """Runs func through the next group commit and returns its result."""
+        return self.submit(func, *args, **kwargs).result()
+
+    def transactional(self, func):
+        """Decorator routing func(conn, ...) through this committer.
+
+        Calling the decorated function waits for its group to commit;
+        func.submit(...) queues it and returns a Future instead, which lets
+        a single thread batch a loop of writes.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        wrapper.submit = functools.partial(self.submit, func)
+        return wrapper
+
+    def _collect(self, first):
+        group = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_batch:
+            try:
+                job = self._jobs.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if job is _STOP:
+                self._jobs.put(_STOP)
+                break
+            group.append(job)
+        return group
+
+    def _run(self):
+        try:
+            conn = sqlite3.connect(self.db_name, isolation_level=None)
+            try:
+                for name, value in self.pragmas.items():
+                    conn.execute(f"PRAGMA {name} = {value}")
+                while True:
+                    job = self._jobs.get()
+                    if job is _STOP:
+                        return
+                    self._commit_group(conn, self._collect(job))
+            finally:
+                conn.close()
+        except BaseException as error:
+            self._fail(error)
+
+    def _fail(self, error):
+        # The writer is gone: refuse new calls and fail the queued ones
+        with self._lock:
+            self._closed = True
+            self._error = error
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP and not job.future.done():
+                job.future.set_exception(error)
+
+    def _commit_group(self, conn, group):
+        outcomes = []
+        try:
+            with traced_statements(conn) as statements:
+                conn.execute("BEGIN")
+                for number, job in enumerate(group):
+                    if not job.future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        # Marks conn as inside a transaction, so transactional()
+                        # calls made by the job nest as savepoints
+                        with _nesting(conn), savepoint(conn, f"group_call_{number}"):
+                            outcomes.append((job, job.func(conn, *job.args, **job.kwargs), None))
+                    except Exception as error:
+                        outcomes.append((job, None, error))
+                conn.execute("COMMIT")
+        except BaseException as error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for job in group:
+                if not job.future.done():
+                    job.future.set_exception(error)
+            if not isinstance(error, Exception):
+                raise
+            return
+        self.groups += 1
+        self.calls += len(outcomes)
+        invalidate_tables(tables_written_by(statements))
+        for job, result, error in outcomes:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+
+    def close(self):
+        """Commits whatever is queued and stops the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._jobs.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
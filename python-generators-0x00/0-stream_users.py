@@ -1,24 +1,53 @@
 import mysql.connector
 
-def stream_users():
-    """Generator that yields rows from user_data table one by one as dicts."""
+import db_pool
+import rows
+
+seed = __import__('seed')
+
+def stream_users(chunk_size=None, row_format='dict'):
+    """Generator that yields rows from user_data table one by one as dicts.
+
+    By default rows come from the connector's default cursor. When chunk_size
+    is given the rows are read through an unbuffered (server-side) cursor with
+    fetchmany(chunk_size), so at most one chunk is held in client memory.
+    row_format='tuple' or 'record' yields the compact rows from rows.py
+    instead of dicts.
+    """
+    if row_format == 'dict':
+        query = "SELECT * FROM user_data;"
+        convert = None
+    else:
+        query = f"SELECT {', '.join(seed.USER_COLUMNS)} FROM user_data;"
+        convert = rows.row_converter(row_format, seed.USER_COLUMNS)
     connection = None
     cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',  # Set your MySQL root password if needed
-            database='ALX_prodev'
-        )
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data;")
-        for row in cursor:
-            yield row
+        connection = db_pool.get_connection()
+        if chunk_size:
+            cursor = connection.cursor(dictionary=convert is None, buffered=False)
+            cursor.execute(query)
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                if convert:
+                    chunk = map(convert, chunk)
+                yield from chunk
+        else:
+            cursor = connection.cursor(dictionary=convert is None)
+            cursor.execute(query)
+            for row in cursor:
+                yield convert(row) if convert else row
     except Exception as err:
         print(f"Error: {err}")
     finally:
         if cursor:
-            cursor.close()
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                # An unbuffered cursor left with unread rows (consumer stopped
+                # early) refuses to close; dropping the connection discards them.
+                pass
         if connection:
             connection.close()
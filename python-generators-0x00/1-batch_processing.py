@@ -1,40 +1,142 @@
 import mysql.connector
 
-def stream_users_in_batches(batch_size):
-    """Generator that yields batches of users from user_data table."""
-    connection = None
+import db_pool
+import rows
+
+seed = __import__('seed')
+
+LOOKUPS = {
+    'exact': '= %s',
+    'ne': '<> %s',
+    'gt': '> %s',
+    'gte': '>= %s',
+    'lt': '< %s',
+    'lte': '<= %s',
+    'startswith': 'LIKE %s',
+    'in': 'IN',
+}
+
+def compile_where(where):
+    """Compiles a {'column__lookup': value} mapping into a WHERE clause and its params.
+
+    Lookups follow the Django convention (age__gt=25, name__startswith='A',
+    user_id__in=[...]); a bare column name means equality. Conditions are
+    ANDed together. Column names are checked against the user_data columns so
+    only values ever reach the SQL as parameters.
+    """
+    if not where:
+        return "", ()
+    clauses = []
+    params = []
+    for key, value in where.items():
+        column, _, lookup = key.partition('__')
+        lookup = lookup or 'exact'
+        if column not in seed.TABLE_COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        if lookup not in LOOKUPS:
+            raise ValueError(f"Unknown lookup: {lookup}")
+        if lookup == 'in':
+            values = list(value)
+            if not values:
+                # An empty IN () is invalid SQL and can never match anyway
+                clauses.append("FALSE")
+                continue
+            clauses.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+        elif lookup == 'startswith':
+            escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append(f"{column} {LOOKUPS[lookup]}")
+            params.append(escaped + '%')
+        else:
+            clauses.append(f"{column} {LOOKUPS[lookup]}")
+            params.append(value)
+    return " WHERE " + " AND ".join(clauses), tuple(params)
+
+def compile_select(columns=None, where=None, order_by=None):
+    """Builds the SELECT statement and params for a projected, filtered scan of user_data."""
+    if columns:
+        unknown = [column for column in columns if column not in seed.TABLE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        projection = ', '.join(columns)
+    else:
+        projection = '*'
+    where_sql, params = compile_where(where)
+    order_sql = ""
+    if order_by:
+        if order_by not in seed.TABLE_COLUMNS:
+            raise ValueError(f"Unknown column: {order_by}")
+        order_sql = f" ORDER BY {order_by}"
+    return f"SELECT {projection} FROM user_data{where_sql}{order_sql};", params
+
+def read_users_in_batches(batch_size, where=None, columns=None, columnar=False,
+                          order_by=None, row_format='dict', connection=None):
+    """Generator behind stream_users_in_batches that raises errors instead of printing them.
+
+    Pass `connection` to read on a connection the caller has already
+    borrowed; it is left open for the caller to close. Otherwise one is
+    taken from the pool for the duration of the scan.
+    """
+    plain = columnar or row_format != 'dict'
+    if plain:
+        # Compact formats are built from plain tuples, so the column order
+        # has to be known up front
+        columns = tuple(columns or seed.USER_COLUMNS)
+    query, params = compile_select(columns, where, order_by)
+    if plain:
+        convert = rows.row_converter(row_format, columns)
+    owned = connection is None
     cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',  # Set your MySQL root password if needed
-            database='ALX_prodev'
-        )
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data;")
-        batch = []
-        for row in cursor:
-            batch.append(row)
-            if len(batch) == batch_size:
+        if owned:
+            connection = db_pool.get_connection()
+        cursor = connection.cursor(dictionary=not plain)
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            if columnar:
+                yield rows.to_columns(columns, batch)
+            elif plain:
+                yield [convert(values) for values in batch]
+            else:
                 yield batch
-                batch = []
-        if batch:
-            yield batch
-    except Exception as err:
-        print(f"Error: {err}")
     finally:
         if cursor:
-            cursor.close()
-        if connection:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                # Consumer stopped early and left unread rows behind
+                pass
+        if owned and connection:
             connection.close()
 
-def batch_processing(batch_size):
-    """Processes each batch to filter users over the age of 25 and prints them."""
-    filtered_users = []
-    for batch in stream_users_in_batches(batch_size):
+def stream_users_in_batches(batch_size, where=None, columns=None, columnar=False,
+                            order_by=None, row_format='dict'):
+    """Generator that yields batches of users from user_data table.
+
+    `where`, `columns` and `order_by` are pushed down into the SQL (see
+    compile_where). Rows are dicts unless row_format is 'tuple' or 'record'
+    (see rows.py); with columnar=True each batch is instead a dict of
+    column -> list of values.
+    """
+    try:
+        yield from read_users_in_batches(
+            batch_size, where, columns, columnar, order_by, row_format
+        )
+    except Exception as err:
+        print(f"Error: {err}")
+
+def batch_processing(batch_size, where=None, columns=None):
+    """Processes each batch to filter users over the age of 25 and prints them.
+
+    The filter runs in MySQL; pass `where`/`columns` to push down a different
+    predicate or projection. Rows are printed batch by batch and nothing is
+    kept once a batch has been handled.
+    """
+    if where is None:
+        where = {'age__gt': 25}
+    for batch in stream_users_in_batches(batch_size, where=where, columns=columns):
         for user in batch:
-            if user['age'] > 25:
-                print(user)
-                filtered_users.append(user)
-    return filtered_users
+            print(user)
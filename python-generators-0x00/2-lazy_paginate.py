@@ -1,3 +1,5 @@
+import prefetch as read_ahead
+
 seed = __import__('seed')
 
 def paginate_users(page_size, offset):
@@ -8,8 +10,56 @@ def paginate_users(page_size, offset):
     connection.close()
     return rows
 
-def lazy_pagination(page_size):
-    """Generator that lazily paginates user_data table."""
+def seek_users(connection, page_size, after=None):
+    """Fetches the page of users whose user_id follows `after`.
+
+    Seeks on the user_data primary key instead of skipping `offset` rows, so
+    every page costs the same no matter how deep into the table it is.
+    """
+    cursor = connection.cursor(dictionary=True)
+    if after is None:
+        cursor.execute(
+            "SELECT * FROM user_data ORDER BY user_id LIMIT %s", (page_size,)
+        )
+    else:
+        cursor.execute(
+            "SELECT * FROM user_data WHERE user_id > %s ORDER BY user_id LIMIT %s",
+            (after, page_size)
+        )
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+def _keyset_pages(page_size):
+    """Generator that walks user_data page by page with keyset pagination."""
+    connection = seed.connect_to_prodev()
+    try:
+        after = None
+        while True:
+            page = seek_users(connection, page_size, after)
+            if not page:
+                break
+            yield page
+            after = page[-1]['user_id']
+    finally:
+        connection.close()
+
+def lazy_pagination(page_size, prefetch=0):
+    """Generator that lazily paginates user_data table.
+
+    Pages are fetched with keyset pagination over a single connection that
+    is reused for the whole walk. With prefetch=K the next K pages are
+    fetched on a background thread while the caller works on the current
+    one; stopping early cancels the read-ahead.
+    """
+    if prefetch:
+        pages = read_ahead.prefetch(lambda: _keyset_pages(page_size), prefetch)
+    else:
+        pages = _keyset_pages(page_size)
+    yield from pages
+
+def lazy_offset_pagination(page_size):
+    """Generator that paginates user_data with LIMIT/OFFSET, one connection per page."""
     offset = 0
     while True:
         page = paginate_users(page_size, offset)
@@ -1,16 +1,13 @@
 import mysql.connector
 
+import db_pool
+
 def stream_user_ages():
     """Generator that yields user ages one by one from user_data table."""
     connection = None
     cursor = None
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',  # Set your MySQL root password if needed
-            database='ALX_prodev'
-        )
+        connection = db_pool.get_connection()
         cursor = connection.cursor()
         cursor.execute("SELECT age FROM user_data;")
         for (age,) in cursor:
@@ -23,6 +20,35 @@ def stream_user_ages():
         if connection:
             connection.close()
 
+def stream_user_age_chunks(chunk_size=10000):
+    """Generator that yields user ages in lists of up to chunk_size values.
+
+    Reads through an unbuffered cursor with fetchmany so only one chunk is
+    held in memory; meant for consumers that process ages in bulk.
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = db_pool.get_connection()
+        cursor = connection.cursor(buffered=False)
+        cursor.execute("SELECT age FROM user_data;")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [age for (age,) in rows]
+    except Exception as err:
+        print(f"Error: {err}")
+    finally:
+        if cursor:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                # Consumer stopped early and left unread rows behind
+                pass
+        if connection:
+            connection.close()
+
 def average_user_age():
     """Calculates and prints the average age of users using a generator."""
     total = 0
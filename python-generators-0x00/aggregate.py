@@ -0,0 +1,258 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; chunks are then reduced in pure Python
+    np = None
+
+seed = __import__('seed')
+stream_ages = __import__('4-stream_ages')
+
+
+# SQL pushdown: MySQL does the work and only the answer crosses the wire
+
+def pushdown_summary():
+    """Returns count, mean, min, max and population stddev of user ages computed in MySQL."""
+    connection = seed.connect_to_prodev()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(age), AVG(age), MIN(age), MAX(age), STDDEV_POP(age) "
+            "FROM user_data;"
+        )
+        count, mean, minimum, maximum, stddev = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+    return {
+        'count': count,
+        'mean': float(mean) if mean is not None else None,
+        'min': float(minimum) if minimum is not None else None,
+        'max': float(maximum) if maximum is not None else None,
+        'stddev': float(stddev) if stddev is not None else None,
+    }
+
+def pushdown_histogram(bucket_width=10):
+    """Returns {bucket_start: count} of user ages grouped into buckets in MySQL."""
+    connection = seed.connect_to_prodev()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT FLOOR(age / %s) * %s AS bucket, COUNT(*) FROM user_data "
+            "GROUP BY bucket ORDER BY bucket;",
+            (bucket_width, bucket_width)
+        )
+        histogram = {float(bucket): count for bucket, count in cursor.fetchall()}
+        cursor.close()
+    finally:
+        connection.close()
+    return histogram
+
+def pushdown_percentile(q):
+    """Returns the q-th quantile (0 <= q <= 1, nearest rank) of user ages.
+
+    MySQL has no PERCENTILE_CONT, so the rank is computed from COUNT and the
+    value is read with a single ORDER BY ... LIMIT 1 OFFSET query.
+    """
+    if not 0 <= q <= 1:
+        raise ValueError("q must be between 0 and 1")
+    connection = seed.connect_to_prodev()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data;")
+        (count,) = cursor.fetchone()
+        if not count:
+            cursor.close()
+            return None
+        rank = max(math.ceil(q * count) - 1, 0)
+        cursor.execute(
+            "SELECT age FROM user_data ORDER BY age LIMIT 1 OFFSET %s;", (rank,)
+        )
+        (age,) = cursor.fetchone()
+        cursor.close()
+    finally:
+        connection.close()
+    return float(age)
+
+
+# Streaming: one pass over stream_user_age_chunks when pushdown is not possible
+
+class StreamingStats:
+    """Single-pass count, mean, variance, min and max.
+
+    Chunks are reduced on their own (vectorized when numpy is available) and
+    merged into the running totals with Chan et al.'s parallel update, so the
+    result is numerically stable and needs O(1) memory.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        """Adds a chunk of values."""
+        if np is not None:
+            chunk = np.asarray(values, dtype=float)
+            if not chunk.size:
+                return
+            count = int(chunk.size)
+            mean = float(chunk.mean())
+            m2 = float(((chunk - mean) ** 2).sum())
+            minimum, maximum = float(chunk.min()), float(chunk.max())
+        else:
+            chunk = [float(value) for value in values]
+            if not chunk:
+                return
+            count = len(chunk)
+            mean = math.fsum(chunk) / count
+            m2 = math.fsum((value - mean) ** 2 for value in chunk)
+            minimum, maximum = min(chunk), max(chunk)
+        self._merge(count, mean, m2, minimum, maximum)
+
+    def _merge(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    @property
+    def variance(self):
+        """Population variance of the values seen so far."""
+        return self._m2 / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        """Population standard deviation of the values seen so far."""
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+
+class P2Quantile:
+    """Streaming quantile estimate with the P-square algorithm (Jain & Chlamtac, 1985).
+
+    Keeps five markers whatever the input size, so an arbitrary quantile can be
+    tracked in one pass and constant memory. The estimate is exact for fewer
+    than five observations.
+    """
+
+    def __init__(self, q):
+        if not 0 < q < 1:
+            raise ValueError("q must be strictly between 0 and 1")
+        self.q = q
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def update(self, values):
+        """Adds a chunk of values."""
+        for value in values:
+            self.add(float(value))
+
+    def add(self, x):
+        """Adds one observation."""
+        heights = self._heights
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+        positions = self._positions
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        for i in range(1, 4):
+            d = self._desired[i] - positions[i]
+            if ((d >= 1 and positions[i + 1] - positions[i] > 1)
+                    or (d <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, d):
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i, d):
+        q, n = self._heights, self._positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    @property
+    def value(self):
+        """Current estimate of the quantile, or None before any observation."""
+        heights = self._heights
+        if not heights:
+            return None
+        if len(heights) < 5:
+            return heights[max(math.ceil(self.q * len(heights)) - 1, 0)]
+        return heights[2]
+
+
+def streaming_histogram(chunks, bucket_width=10):
+    """Returns {bucket_start: count} built in one pass over chunks of values."""
+    histogram = {}
+    for chunk in chunks:
+        if np is not None:
+            values = np.asarray(chunk, dtype=float)
+            buckets, counts = np.unique(
+                np.floor(values / bucket_width) * bucket_width, return_counts=True
+            )
+            pairs = zip(buckets.tolist(), counts.tolist())
+        else:
+            pairs = {}
+            for value in chunk:
+                bucket = math.floor(float(value) / bucket_width) * bucket_width
+                pairs[bucket] = pairs.get(bucket, 0) + 1
+            pairs = pairs.items()
+        for bucket, count in pairs:
+            histogram[float(bucket)] = histogram.get(float(bucket), 0) + count
+    return dict(sorted(histogram.items()))
+
+
+def streaming_summary(chunks, quantiles=(0.5, 0.9, 0.99)):
+    """Computes summary statistics and quantile estimates in one pass over chunks."""
+    stats = StreamingStats()
+    sketches = [P2Quantile(q) for q in quantiles]
+    for chunk in chunks:
+        stats.update(chunk)
+        for sketch in sketches:
+            sketch.update(chunk)
+    return {
+        'count': stats.count,
+        'mean': stats.mean if stats.count else None,
+        'min': stats.min,
+        'max': stats.max,
+        'stddev': stats.stddev,
+        'quantiles': {sketch.q: sketch.value for sketch in sketches},
+    }
+
+
+def summarize_ages(pushdown=True, quantiles=(0.5, 0.9, 0.99), chunk_size=10000):
+    """Summarizes user ages, in MySQL when pushdown is True, otherwise by streaming."""
+    if pushdown:
+        summary = pushdown_summary()
+        summary['quantiles'] = {q: pushdown_percentile(q) for q in quantiles}
+        return summary
+    return streaming_summary(stream_ages.stream_user_age_chunks(chunk_size), quantiles)
@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import threading
+from contextlib import aclosing
+
+from prefetch import DONE, Failure, feed
+
+batch_processing = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate')
+stream_ages = __import__('4-stream_ages')
+
+async def iterate_in_thread(factory, read_ahead=2):
+    """Async generator over the blocking generator returned by factory().
+
+    The blocking generator runs on its own thread (so mysql-connector never
+    blocks the event loop) and hands items over through an asyncio.Queue of
+    size read_ahead: the thread reads at most read_ahead items ahead of the
+    consumer and then waits, which gives backpressure. Closing the async
+    generator early (break, aclose(), cancellation) stops the thread and
+    closes the blocking generator.
+    """
+    if read_ahead < 1:
+        raise ValueError("read_ahead must be at least 1")
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(read_ahead)
+    stop = threading.Event()
+    finished = loop.create_future()
+
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while not stop.is_set():
+            try:
+                future.result(timeout=0.1)
+                return True
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+        return False
+
+    def produce():
+        try:
+            feed(factory, put)
+        finally:
+            loop.call_soon_threadsafe(_resolve, finished)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is DONE:
+                break
+            if isinstance(item, Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        await finished
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def async_stream_users_in_batches(batch_size, read_ahead=2, **kwargs):
+    """Async counterpart of stream_users_in_batches; kwargs are passed through."""
+    batches = iterate_in_thread(
+        lambda: batch_processing.stream_users_in_batches(batch_size, **kwargs),
+        read_ahead,
+    )
+    async with aclosing(batches):
+        async for batch in batches:
+            yield batch
+
+
+async def async_stream_users(chunk_size=1000, row_format='dict', read_ahead=2):
+    """Async counterpart of stream_users: yields users one by one.
+
+    Rows cross from the worker thread in chunks of chunk_size, so the
+    thread hand-off is paid once per chunk rather than once per row.
+    """
+    batches = async_stream_users_in_batches(
+        chunk_size, read_ahead, row_format=row_format
+    )
+    async with aclosing(batches):
+        async for batch in batches:
+            for row in batch:
+                yield row
+
+
+async def async_lazy_pagination(page_size, read_ahead=2):
+    """Async counterpart of lazy_pagination: yields pages of users."""
+    pages = iterate_in_thread(
+        lambda: lazy_paginate.lazy_pagination(page_size), read_ahead
+    )
+    async with aclosing(pages):
+        async for page in pages:
+            yield page
+
+
+async def async_stream_user_ages(chunk_size=1000, read_ahead=2):
+    """Async counterpart of stream_user_ages: yields ages one by one."""
+    chunks = iterate_in_thread(
+        lambda: stream_ages.stream_user_age_chunks(chunk_size), read_ahead
+    )
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            for age in chunk:
+                yield age
@@ -0,0 +1,419 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import multiprocessing
+import platform
+import queue
+import random
+import resource
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+import db_pool
+import rows
+import sqlite_backend
+
+seed = __import__('seed')
+stream_users = __import__('0-stream_users').stream_users
+batch_processing = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate')
+stream_ages = __import__('4-stream_ages')
+partitioned_scan = __import__('partitioned_scan')
+
+SCALES = {'10k': 10000, '1M': 1000000, '10M': 10000000}
+
+# Which database the generators talk to; copied into every measuring process
+BACKEND = {'name': 'mysql', 'path': None}
+
+
+def use_backend(name, path=None):
+    """Points the shared pool at MySQL (the default) or at an SQLite stand-in file."""
+    BACKEND.update(name=name, path=path)
+    db_pool.configure(factory=_backend_factory())
+
+
+def _backend_factory():
+    if BACKEND['name'] == 'sqlite':
+        return functools.partial(sqlite_backend.connect, BACKEND['path'])
+    return None
+
+
+def _peak_rss_kb():
+    """Returns the peak resident set size of this process in kilobytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _run(factory, results, backend):
+    """Drains the generator returned by factory and records its timings.
+
+    An error is reported back as {'error': traceback} so the parent can
+    raise it instead of waiting for a result that never comes.
+    """
+    try:
+        use_backend(**backend)
+        start = time.perf_counter()
+        first_row = None
+        rows = 0
+        for item in factory():
+            if first_row is None:
+                first_row = time.perf_counter() - start
+            # Paginating generators yield whole pages; count the rows inside them
+            rows += len(item) if isinstance(item, list) else 1
+        total_time = time.perf_counter() - start
+    except Exception:
+        results.put({'error': traceback.format_exc()})
+        return
+    pool_stats = db_pool.get_pool().stats()
+    results.put({
+        'rows': rows,
+        'rows_per_sec': rows / total_time if total_time else 0,
+        'time_to_first_row': first_row,
+        'total_time': total_time,
+        'peak_rss_kb': _peak_rss_kb(),
+        'connections_opened': pool_stats.get('created', 0),
+        'connections_acquired': pool_stats.get('acquired', 0),
+    })
+
+
+def measure(factory, timeout=None):
+    """Runs factory() to exhaustion in a fresh process.
+
+    A separate process is used so that the peak RSS of one run is not
+    inflated by whatever a previous run left allocated. Raises
+    RuntimeError if the run fails or the process dies without reporting,
+    and TimeoutError (after killing it) if it takes over `timeout` seconds.
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run, args=(factory, results, dict(BACKEND))
+    )
+    process.start()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    try:
+        result = _wait_for_result(process, results, deadline)
+    except BaseException:
+        process.terminate()
+        raise
+    finally:
+        process.join()
+    if 'error' in result:
+        raise RuntimeError(f"{factory.__name__} failed:\n{result['error']}")
+    return result
+
+
+def _wait_for_result(process, results, deadline):
+    # Polls, so a child that crashed or hangs cannot block the parent forever
+    while True:
+        try:
+            return results.get(timeout=0.5)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            try:
+                # The result may have been sent just before the child exited
+                return results.get(timeout=0.5)
+            except queue.Empty:
+                raise RuntimeError(
+                    f"Benchmark process exited with code {process.exitcode} "
+                    f"without reporting a result"
+                ) from None
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError("Benchmark process did not finish in time")
+
+
+def _stream_users_default():
+    return stream_users()
+
+
+def _stream_users_chunked():
+    return stream_users(chunk_size=1000)
+
+
+def bench_stream_users():
+    """Compares the default stream_users cursor with the chunked server-side mode."""
+    return {
+        'default': measure(_stream_users_default),
+        'server_side': measure(_stream_users_chunked),
+    }
+
+
+def seed_synthetic(rows, batch_size=10000):
+    """Fills user_data with random users until it holds exactly `rows` rows.
+
+    A table that already holds the right number of rows is left alone, so
+    repeated runs at one scale only pay for seeding once; a larger table is
+    emptied and reseeded.
+    """
+    connection = seed.connect_to_prodev()
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    (existing,) = cursor.fetchone()
+    if existing > rows:
+        cursor.execute("DELETE FROM user_data")
+        connection.commit()
+        existing = 0
+    missing = rows - existing
+    while missing > 0:
+        batch = []
+        for _ in range(min(batch_size, missing)):
+            user_id = str(uuid.uuid4())
+            batch.append((user_id, f"user {user_id[:8]}",
+                          f"{user_id[:8]}@example.com", random.randint(18, 100)))
+        cursor.executemany(
+            "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
+            batch
+        )
+        connection.commit()
+        missing -= len(batch)
+    cursor.close()
+    connection.close()
+
+
+def _keyset_pages():
+    return lazy_paginate.lazy_pagination(1000)
+
+
+def _offset_pages():
+    return lazy_paginate.lazy_offset_pagination(1000)
+
+
+def bench_pagination(rows=1000000):
+    """Compares keyset pagination with LIMIT/OFFSET over a seeded table."""
+    seed_synthetic(rows)
+    return {
+        'keyset': measure(_keyset_pages),
+        'offset': measure(_offset_pages),
+    }
+
+
+def _single_range_scan():
+    return partitioned_scan.scan_partitions(partitions=1)
+
+
+def _four_range_scan():
+    return partitioned_scan.scan_partitions(partitions=4)
+
+
+def bench_partitioned_scan():
+    """Compares a single-connection scan with a four-way partitioned scan."""
+    return {
+        'scan_x1': measure(_single_range_scan),
+        'scan_x4': measure(_four_range_scan),
+    }
+
+
+def bench_pool_acquire(threads=16, acquisitions=200, max_size=8):
+    """Hammers a fresh pool from `threads` threads and returns its stats.
+
+    Each acquisition runs a trivial query so connections are held for a
+    realistic moment; the acquire latency percentiles show how long callers
+    waited for a connection once the pool is saturated.
+    """
+    pool = db_pool.ConnectionPool(factory=_backend_factory(), max_size=max_size)
+
+    def worker():
+        for _ in range(acquisitions):
+            connection = pool.acquire()
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stats = pool.stats()
+    pool.close()
+    return stats
+
+
+def _stream_users_as(row_format):
+    return lambda: stream_users(chunk_size=1000, row_format=row_format)
+
+
+def _row_memory(row_format, count):
+    """Returns bytes per row and rows/sec for building `count` synthetic rows."""
+    convert = rows.row_converter(row_format, seed.USER_COLUMNS)
+    values = [
+        (str(uuid.UUID(int=i)), f"user {i}", f"user{i}@example.com", i % 100)
+        for i in range(count)
+    ]
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = [convert(row) for row in values]
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del built
+    return {'bytes_per_row': size / count, 'rows_per_sec': count / elapsed}
+
+
+def bench_row_formats(count=100000):
+    """Compares dict rows with the compact formats from rows.py.
+
+    Memory is measured on synthetic rows held in a list (the shared field
+    values are excluded, only the row containers count); throughput is
+    measured by streaming user_data in each format.
+    """
+    report = {}
+    for row_format in rows.ROW_FORMATS:
+        report[row_format] = _row_memory(row_format, count)
+        streamed = _run_inline(_stream_users_as(row_format))
+        report[row_format]['stream_rows_per_sec'] = (
+            streamed['rows'] / streamed['total_time'] if streamed['total_time'] else 0
+        )
+    return report
+
+
+def _run_inline(factory):
+    """Like measure() but in this process; used where peak RSS is not needed."""
+    start = time.perf_counter()
+    count = sum(1 for _ in factory())
+    return {'rows': count, 'total_time': time.perf_counter() - start}
+
+
+def prepare(rows):
+    """Creates user_data on the current backend and seeds it with `rows` users."""
+    connection = seed.connect_to_prodev()
+    if BACKEND['name'] == 'sqlite':
+        sqlite_backend.create_table(connection)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed.create_table(connection)
+    connection.close()
+    seed_synthetic(rows)
+
+
+def _batches():
+    return batch_processing.stream_users_in_batches(1000)
+
+
+def _batches_over_25():
+    return batch_processing.stream_users_in_batches(1000, where={'age__gt': 25})
+
+
+def _prefetched_pages():
+    return lazy_paginate.lazy_pagination(1000, prefetch=2)
+
+
+def _ages():
+    return stream_ages.stream_user_ages()
+
+
+def _average_age():
+    with contextlib.redirect_stdout(io.StringIO()):
+        stream_ages.average_user_age()
+    yield None
+
+
+CASES = {
+    'stream_users': _stream_users_default,
+    'stream_users_chunked': _stream_users_chunked,
+    'stream_users_in_batches': _batches,
+    'batch_processing_pushdown': _batches_over_25,
+    'lazy_pagination': _keyset_pages,
+    'lazy_pagination_prefetch': _prefetched_pages,
+    'lazy_offset_pagination': _offset_pages,
+    'stream_user_ages': _ages,
+    'average_user_age': _average_age,
+    'scan_partitions_x4': _four_range_scan,
+}
+
+
+def run_suite(rows, cases=None):
+    """Seeds the table at `rows` users and measures every case. Returns the JSON report."""
+    prepare(rows)
+    results = {}
+    for name in cases or CASES:
+        results[name] = measure(CASES[name])
+    return {
+        'meta': {
+            'backend': BACKEND['name'],
+            'rows': rows,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=0.1):
+    """Prints rows/sec against a baseline report; returns the cases that regressed.
+
+    A case regresses when its throughput drops by more than `threshold`.
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('rows_per_sec'):
+            continue
+        ratio = result['rows_per_sec'] / before['rows_per_sec']
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<26} {before['rows_per_sec']:>12.0f} -> "
+              f"{result['rows_per_sec']:>12.0f} rows/s ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def print_report(report):
+    """Prints one line per benchmark case."""
+    for name, result in report.items():
+        first_row = result['time_to_first_row'] or 0
+        print(f"{name:<26} rows={result['rows']:<10} "
+              f"first_row={first_row * 1000:.1f}ms "
+              f"total={result['total_time']:.2f}s "
+              f"peak_rss={result['peak_rss_kb'] / 1024:.1f}MB "
+              f"connections={result.get('connections_opened', '-')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the user_data generators.")
+    parser.add_argument('--backend', choices=('mysql', 'sqlite'), default='mysql')
+    parser.add_argument('--sqlite-path', help="SQLite file (default: benchmark_<rows>.db)")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+    parser.add_argument('--rows', type=int, help="exact row count, overrides --scale")
+    parser.add_argument('--cases', help="comma separated subset of: " + ', '.join(CASES))
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="allowed rows/sec drop before a case counts as a regression")
+    args = parser.parse_args(argv)
+
+    row_count = args.rows or SCALES[args.scale]
+    cases = args.cases.split(',') if args.cases else None
+    unknown = [name for name in cases or () if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    path = args.sqlite_path or f"benchmark_{row_count}.db"
+    use_backend(args.backend, path if args.backend == 'sqlite' else None)
+
+    report = run_suite(row_count, cases)
+    print_report(report['results'])
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import collections
+import os
+import threading
+import time
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '',  # Set your MySQL root password if needed
+    'database': 'ALX_prodev',
+}
+
+# Only the most recent acquire latencies are kept for the percentiles
+_LATENCY_SAMPLES = 10000
+
+
+class PooledConnection:
+    """Connection handed out by ConnectionPool.
+
+    Behaves like the underlying connection, except that close() hands it back
+    to the pool instead of closing the socket.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise mysql.connector.errors.OperationalError(
+                "Connection was already returned to the pool"
+            )
+        return getattr(raw, name)
+
+    def close(self):
+        """Returns the connection to the pool. Safe to call more than once."""
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections.
+
+    Connections are opened lazily up to max_size and reused most-recently-used
+    first, so under light load the spare ones sit idle and are closed after
+    idle_timeout seconds. A connection that has been idle for longer than
+    health_check_after seconds is checked with is_connected() before being
+    handed out and replaced if it went away. acquire() waits up to `timeout`
+    seconds for a free connection and raises PoolError after that.
+    """
+
+    def __init__(self, factory=None, max_size=8, idle_timeout=300,
+                 health_check_after=30, timeout=10):
+        self._factory = factory or (lambda: mysql.connector.connect(**DB_CONFIG))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = collections.deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._latencies = collections.deque(maxlen=_LATENCY_SAMPLES)
+        self._counters = collections.Counter()
+
+    def acquire(self, timeout=None):
+        """Returns a PooledConnection, opening a new connection if none is idle."""
+        started = time.perf_counter()
+        deadline = started + (self.timeout if timeout is None else timeout)
+        while True:
+            raw, last_used = self._checkout(deadline)
+            if raw is None:
+                try:
+                    raw = self._factory()
+                except Exception:
+                    self._forget()
+                    raise
+                self._counters['created'] += 1
+            elif (time.monotonic() - last_used > self.health_check_after
+                    and not self._healthy(raw)):
+                self._discard(raw)
+                self._counters['unhealthy'] += 1
+                continue
+            break
+        self._latencies.append(time.perf_counter() - started)
+        self._counters['acquired'] += 1
+        return PooledConnection(self, raw)
+
+    def _checkout(self, deadline):
+        """Takes an idle connection or reserves a slot for a new one (returns None)."""
+        stale = []
+        try:
+            with self._cond:
+                while True:
+                    stale.extend(self._evict_idle())
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, None
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolError(
+                            f"No connection available within the timeout "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._counters['waits'] += 1
+                    self._cond.wait(remaining)
+        finally:
+            for raw in stale:
+                self._close_quietly(raw)
+
+    def _evict_idle(self):
+        """Pops connections idle for longer than idle_timeout. Caller holds the lock."""
+        now = time.monotonic()
+        evicted = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            raw, _ = self._idle.popleft()
+            self._size -= 1
+            self._counters['evicted'] += 1
+            evicted.append(raw)
+        return evicted
+
+    @staticmethod
+    def _healthy(raw):
+        try:
+            return raw.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _forget(self):
+        """Frees a slot whose connection is gone."""
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _discard(self, raw):
+        self._close_quietly(raw)
+        self._counters['closed'] += 1
+        self._forget()
+
+    def _release(self, raw):
+        """Puts a connection back, resetting it or dropping it if it is not reusable."""
+        if getattr(raw, 'unread_result', False):
+            # Reading the rest of an abandoned unbuffered result could take
+            # longer than reconnecting
+            self._discard(raw)
+            return
+        try:
+            if getattr(raw, 'in_transaction', False):
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        """Returns pool sizes, lifetime counters and acquire latency percentiles (ms)."""
+        with self._cond:
+            idle = len(self._idle)
+            size = self._size
+        latencies = sorted(self._latencies)
+        stats = {'size': size, 'idle': idle, 'in_use': size - idle}
+        stats.update(self._counters)
+        if latencies:
+            def percentile(q):
+                return latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000
+            stats.update({
+                'acquire_p50_ms': percentile(0.5),
+                'acquire_p95_ms': percentile(0.95),
+                'acquire_p99_ms': percentile(0.99),
+                'acquire_max_ms': latencies[-1] * 1000,
+            })
+        return stats
+
+    def close(self):
+        """Closes every idle connection; connections in use close when released."""
+        with self._cond:
+            idle, self._idle = self._idle, collections.deque()
+            self._size -= len(idle)
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """Replaces the shared pool with one built from ConnectionPool(**kwargs)."""
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, ConnectionPool(**kwargs)
+    if old is not None and old.pid == os.getpid():
+        old.close()
+    return _pool
+
+
+def get_pool():
+    """Returns the shared pool, creating it on first use.
+
+    A pool inherited through fork() is not reused: its sockets belong to the
+    parent, so the child starts a pool of its own with the same settings.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        elif _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                factory=_pool._factory,
+                max_size=_pool.max_size,
+                idle_timeout=_pool.idle_timeout,
+                health_check_after=_pool.health_check_after,
+                timeout=_pool.timeout,
+            )
+        return _pool
+
+
+def get_connection(timeout=None):
+    """Borrows a connection to ALX_prodev from the shared pool; close() gives it back."""
+    return get_pool().acquire(timeout)
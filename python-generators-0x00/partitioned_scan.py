@@ -0,0 +1,140 @@
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+from mysql.connector.errors import PoolError
+
+import db_pool
+from prefetch import Handoff
+
+batch_processing = __import__('1-batch_processing')
+
+# user_id values are lowercase UUID strings, so ranges are cut on their
+# leading hex digits; uuid4 keys spread evenly over that space.
+_PREFIX_DIGITS = 4
+
+
+def key_ranges(partitions):
+    """Splits the user_id key space into `partitions` (lower, upper) ranges.
+
+    The lower bound is inclusive and the upper bound exclusive; None stands
+    for an open end, so the ranges cover every possible key exactly once.
+    """
+    if partitions < 1:
+        raise ValueError("partitions must be at least 1")
+    space = 16 ** _PREFIX_DIGITS
+    bounds = [
+        format(i * space // partitions, f'0{_PREFIX_DIGITS}x')
+        for i in range(1, partitions)
+    ]
+    lowers = [None] + bounds
+    uppers = bounds + [None]
+    return list(zip(lowers, uppers))
+
+
+def range_where(lower, upper, where=None):
+    """Adds the user_id bounds of a key range to a where mapping."""
+    where = dict(where or {})
+    for key, bound in (('user_id__gte', lower), ('user_id__lt', upper)):
+        if bound is None:
+            continue
+        if key in where:
+            raise ValueError(f"where already constrains {key}")
+        where[key] = bound
+    return where
+
+
+def scan_range(lower, upper, batch_size=1000, where=None, columns=None, ordered=False,
+               connection=None):
+    """Generator that yields batches of users whose user_id falls in [lower, upper).
+
+    Errors are raised, not printed, so a failed range cannot pass for a
+    short one. `connection` is an already borrowed connection to read on.
+    """
+    return batch_processing.read_users_in_batches(
+        batch_size,
+        where=range_where(lower, upper, where),
+        columns=columns,
+        order_by='user_id' if ordered else None,
+        connection=connection,
+    )
+
+
+def _reserve_connections(count):
+    """Borrows `count` pooled connections at once, or raises PoolError."""
+    pool = db_pool.get_pool()
+    if pool.max_size < count:
+        raise PoolError(
+            f"Scanning {count} partitions needs {count} connections but the pool "
+            f"holds at most {pool.max_size}; raise max_size with db_pool.configure()"
+        )
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(pool.acquire())
+    except Exception:
+        for connection in connections:
+            connection.close()
+        raise
+    return connections
+
+
+def scan_partitions(partitions=4, batch_size=1000, where=None, columns=None,
+                    ordered=False, max_queue=8):
+    """Generator that scans user_data in `partitions` key ranges concurrently.
+
+    Each range is streamed on its own thread and connection. The
+    connections are all borrowed before the scan starts, so a pool too
+    small for `partitions` fails with PoolError up front, and an error in
+    any range is raised here rather than cutting the scan short. Unordered
+    mode yields batches as soon as any range produces one; ordered mode
+    yields the ranges one after the other in user_id order while the later
+    ranges keep reading ahead. At most `max_queue` batches per range are
+    buffered, and closing the generator early stops every worker.
+    """
+    ranges = key_ranges(partitions)
+    connections = _reserve_connections(len(ranges))
+    if ordered:
+        handoffs = [Handoff(max_queue) for _ in ranges]
+    else:
+        shared = Handoff(max_queue * len(ranges), producers=len(ranges))
+        handoffs = [shared] * len(ranges)
+    workers = []
+    try:
+        for (lower, upper), handoff, connection in zip(ranges, handoffs, connections):
+            workers.append(handoff.start(functools.partial(
+                scan_range, lower, upper, batch_size, where, columns, ordered, connection
+            )))
+        if ordered:
+            for handoff in handoffs:
+                yield from handoff
+        else:
+            yield from shared
+    finally:
+        # Workers blocked on a full queue notice the close and exit
+        for handoff in handoffs:
+            handoff.close()
+        for worker in workers:
+            worker.join()
+        for connection in connections:
+            connection.close()
+
+
+def _reduce_range(func, lower, upper, batch_size, where, columns):
+    return func(scan_range(lower, upper, batch_size, where, columns))
+
+
+def map_partitions(func, partitions=4, batch_size=1000, where=None, columns=None,
+                   processes=None):
+    """Runs func(batches) for every key range in a process pool.
+
+    `func` receives the batch generator of one range and returns a value,
+    which keeps CPU-heavy work off the GIL. It must be picklable (a module
+    level function). Returns the per-range results in key order.
+    """
+    ranges = key_ranges(partitions)
+    with ProcessPoolExecutor(max_workers=processes or partitions) as pool:
+        futures = [
+            pool.submit(_reduce_range, func, lower, upper, batch_size, where, columns)
+            for lower, upper in ranges
+        ]
+        return [future.result() for future in futures]
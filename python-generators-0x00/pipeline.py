@@ -0,0 +1,248 @@
+import collections
+import heapq
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from prefetch import prefetch
+
+
+def batched(iterable, size):
+    """Generator that groups items into lists of `size` (the last one may be shorter)."""
+    if size < 1:
+        raise ValueError("size must be at least 1")
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def window(iterable, size, step=1):
+    """Generator of sliding windows: tuples of `size` consecutive items, `step` apart."""
+    if size < 1 or step < 1:
+        raise ValueError("size and step must be at least 1")
+    current = collections.deque(maxlen=size)
+    skip = 0
+    for item in iterable:
+        current.append(item)
+        if len(current) < size:
+            continue
+        if skip:
+            skip -= 1
+            continue
+        yield tuple(current)
+        skip = step - 1
+
+
+def tee(iterable, n=2, max_buffer=None):
+    """Splits one iterator into n independent ones, like itertools.tee.
+
+    Items are buffered for the branches that have not read them yet. With
+    max_buffer set, a branch that would get more than max_buffer items
+    ahead of the slowest one raises BufferError instead of buffering
+    without bound; the check comes before the next item is read, so the
+    other branches lose nothing. A branch that raised, was closed or ran
+    out is no longer buffered for and does not hold the others back.
+    """
+    iterator = iter(iterable)
+    buffers = [collections.deque() for _ in range(n)]
+    # Buffers of the branches still being read, by position
+    live = dict(enumerate(buffers))
+
+    def branch(index, own):
+        try:
+            while True:
+                if not own:
+                    if max_buffer is not None and any(
+                        len(other) >= max_buffer for other in live.values()
+                    ):
+                        raise BufferError(
+                            f"tee branch got more than {max_buffer} items ahead"
+                        )
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    for other in live.values():
+                        other.append(item)
+                yield own.popleft()
+        finally:
+            live.pop(index, None)
+
+    return tuple(branch(index, own) for index, own in enumerate(buffers))
+
+
+def merge(*iterables, key=None):
+    """Merges several iterables into one generator.
+
+    With a key, the inputs must each be sorted by it and the output is the
+    sorted merge (heapq.merge); without one, items are taken round-robin.
+    """
+    if key is not None:
+        yield from heapq.merge(*iterables, key=key)
+        return
+    iterators = collections.deque(iter(iterable) for iterable in iterables)
+    while iterators:
+        iterator = iterators.popleft()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            continue
+        yield item
+        iterators.append(iterator)
+
+
+def parallel_map(func, iterable, workers=4, processes=False, ordered=True, in_flight=None):
+    """Generator that applies func to every item on a thread or process pool.
+
+    At most `in_flight` items (default 2 per worker) are submitted ahead of
+    what the caller has consumed, so a slow consumer does not make the pool
+    read the whole input. Results come back in input order unless
+    ordered=False, in which case they are yielded as they finish. With
+    processes=True, func and the items must be picklable.
+    """
+    in_flight = in_flight or workers * 2
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    iterator = iter(iterable)
+    with executor_class(max_workers=workers) as executor:
+        pending = collections.deque(
+            executor.submit(func, item) for item in itertools.islice(iterator, in_flight)
+        )
+        try:
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    done = [future for future in pending if future in finished]
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    result = future.result()
+                    for item in itertools.islice(iterator, 1):
+                        pending.append(executor.submit(func, item))
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class StageStats:
+    """Throughput counters of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        """Items per second since the stage was first pulled from."""
+        elapsed = self.elapsed
+        return self.items / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'items': self.items,
+            'busy_seconds': self.busy,
+            'elapsed_seconds': self.elapsed,
+            'items_per_sec': self.rate,
+        }
+
+
+class Pipeline:
+    """Lazy, chainable composition of the combinators above.
+
+        Pipeline(stream_users(chunk_size=1000)).filter(lambda u: u['age'] > 25)
+            .map(to_report).batched(500).buffer(4)
+
+    Nothing runs until the pipeline is iterated; use it as a context
+    manager (or call close()) to release the source when stopping early.
+    Every stage counts the items it hands downstream and the time spent
+    producing them (which includes the stages above it); see report().
+    """
+
+    def __init__(self, source, name='source'):
+        self.stages = []
+        self._iterator = self._counted(iter(source), name)
+
+    def _counted(self, iterator, name):
+        stats = StageStats(name)
+        self.stages.append(stats)
+
+        def counted():
+            try:
+                while True:
+                    start = time.perf_counter()
+                    if stats.started is None:
+                        stats.started = start
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        stats.finished = time.perf_counter()
+                        return
+                    finally:
+                        stats.busy += time.perf_counter() - start
+                    stats.items += 1
+                    yield item
+            finally:
+                # Stopping early must reach the source, e.g. to release its connection
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+
+        return counted()
+
+    def _then(self, name, stage):
+        self._iterator = self._counted(iter(stage(self._iterator)), name)
+        return self
+
+    def filter(self, predicate):
+        return self._then('filter', lambda items: (item for item in items if predicate(item)))
+
+    def map(self, func):
+        return self._then('map', lambda items: (func(item) for item in items))
+
+    def batched(self, size):
+        return self._then(f'batched({size})', lambda items: batched(items, size))
+
+    def window(self, size, step=1):
+        return self._then(f'window({size})', lambda items: window(items, size, step))
+
+    def parallel_map(self, func, workers=4, processes=False, ordered=True):
+        return self._then(
+            f'parallel_map({workers})',
+            lambda items: parallel_map(func, items, workers, processes, ordered),
+        )
+
+    def buffer(self, depth):
+        """Reads up to `depth` items ahead on a background thread (see prefetch)."""
+        return self._then(f'buffer({depth})', lambda items: prefetch(lambda: items, depth))
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        """Stops the pipeline early, closing every stage down to the source."""
+        self._iterator.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def report(self):
+        """Returns the per-stage counters, upstream first."""
+        return [stats.as_dict() for stats in self.stages]
@@ -0,0 +1,98 @@
+import queue
+import threading
+
+# Put after a producer's last item
+DONE = object()
+
+
+class Failure:
+    """Carries an exception raised by a producer thread over to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def feed(factory, put):
+    """Producer loop shared by the reader threads.
+
+    Iterates factory() and hands each item to put(), then DONE, or a
+    Failure if the producer raised. Stops early when put() returns False
+    (the consumer went away) and always closes the producer.
+    """
+    items = None
+    try:
+        items = iter(factory())
+        for item in items:
+            if not put(item):
+                return
+        put(DONE)
+    except Exception as err:
+        put(Failure(err))
+    finally:
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
+
+
+class Handoff:
+    """Bounded queue from `producers` reader threads to one consuming generator.
+
+    Readers started with start() wait while the queue is full, polling so
+    that close() can stop them. Iterating yields items until every reader
+    has finished and re-raises the first error a reader hit.
+    """
+
+    def __init__(self, maxsize, producers=1):
+        self._queue = queue.Queue(maxsize)
+        self._producers = producers
+        self._stop = threading.Event()
+
+    def put(self, item):
+        """Queues item, giving up once close() was called. Returns whether it was queued."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def start(self, factory):
+        """Starts a daemon thread feeding factory()'s items into the queue."""
+        reader = threading.Thread(target=feed, args=(factory, self.put), daemon=True)
+        reader.start()
+        return reader
+
+    def __iter__(self):
+        remaining = self._producers
+        while remaining:
+            item = self._queue.get()
+            if item is DONE:
+                remaining -= 1
+            elif isinstance(item, Failure):
+                raise item.error
+            else:
+                yield item
+
+    def close(self):
+        """Stops the readers; each one closes its producer as it exits."""
+        self._stop.set()
+
+
+def prefetch(factory, depth=1):
+    """Generator that reads the iterable returned by factory() ahead on a thread.
+
+    Up to `depth` items are fetched while the caller is still busy with the
+    current one, so I/O in the producer overlaps with work in the consumer.
+    The reader waits when the queue is full. Closing this generator (or
+    breaking out of the loop) stops the reader and closes the producer.
+    """
+    if depth < 1:
+        raise ValueError("depth must be at least 1")
+    handoff = Handoff(depth)
+    reader = handoff.start(factory)
+    try:
+        yield from handoff
+    finally:
+        handoff.close()
+        reader.join()
@@ -0,0 +1,90 @@
+import functools
+from collections import namedtuple
+
+seed = __import__('seed')
+
+ROW_FORMATS = ('dict', 'tuple', 'record')
+
+
+class Record:
+    """Base class for compact rows: fixed attributes in __slots__, no per-row __dict__.
+
+    Values are read as attributes (row.age) or, like dict rows, by column
+    name (row['age']).
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, column):
+        if column not in self.__slots__:
+            raise KeyError(column)
+        return getattr(self, column)
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def _asdict(self):
+        return dict(zip(self.__slots__, self._values()))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={value!r}" for name, value in self._asdict().items())
+        return f"{type(self).__name__}({fields})"
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(columns):
+    """Returns the Record subclass for a tuple of column names.
+
+    Like namedtuple, the class gets a generated __init__ with one argument
+    per column, which is several times faster than the generic loop.
+    """
+    columns = tuple(columns)
+    invalid = [column for column in columns if not column.isidentifier()]
+    if invalid:
+        raise ValueError(f"Invalid column names: {', '.join(invalid)}")
+    body = ''.join(f"\n    self.{column} = {column}" for column in columns) or "\n    pass"
+    namespace = {}
+    exec(f"def __init__(self, {', '.join(columns)}):{body}", namespace)
+    return type('UserRecord', (Record,), {
+        '__slots__': columns,
+        '__init__': namespace['__init__'],
+    })
+
+
+@functools.lru_cache(maxsize=None)
+def tuple_type(columns):
+    """Returns the namedtuple class for a tuple of column names."""
+    return namedtuple('UserRow', columns)
+
+
+UserRecord = record_type(seed.USER_COLUMNS)
+UserRow = tuple_type(seed.USER_COLUMNS)
+
+
+def row_converter(row_format, columns):
+    """Returns a function turning a plain cursor tuple into a row of `row_format`."""
+    columns = tuple(columns)
+    if row_format == 'dict':
+        return lambda values: dict(zip(columns, values))
+    if row_format == 'tuple':
+        return tuple_type(columns)._make
+    if row_format == 'record':
+        cls = record_type(columns)
+        return lambda values: cls(*values)
+    raise ValueError(f"Unknown row format: {row_format} (expected one of {ROW_FORMATS})")
+
+
+def to_columns(columns, rows):
+    """Turns plain cursor tuples into a dict of column -> list of values."""
+    if not rows:
+        return {}
+    return dict(zip(columns, map(list, zip(*rows))))
@@ -1,16 +1,20 @@
 import mysql.connector
 import csv
+import io
+import json
+import os
+import time
 import uuid
 
+import db_pool
+
 def connect_db():
     """Connects to the MySQL server (not to a specific database)."""
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password=''  # Set your MySQL root password if needed
-        )
-        return connection
+        server_config = {
+            key: value for key, value in db_pool.DB_CONFIG.items() if key != 'database'
+        }
+        return mysql.connector.connect(**server_config)
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
@@ -25,15 +29,12 @@ def create_database(connection):
         print(f"Error: {err}")
 
 def connect_to_prodev():
-    """Connects to the ALX_prodev database."""
+    """Borrows a connection to the ALX_prodev database from the shared pool.
+
+    Closing the returned connection gives it back to the pool.
+    """
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',  # Set your MySQL root password if needed
-            database='ALX_prodev'
-        )
-        return connection
+        return db_pool.get_connection()
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
@@ -48,31 +49,209 @@ def create_table(connection):
                 name VARCHAR(255) NOT NULL,
                 email VARCHAR(255) NOT NULL,
                 age DECIMAL NOT NULL,
-                INDEX(user_id)
+                updated_at TIMESTAMP(6) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+                INDEX(user_id),
+                INDEX(updated_at, user_id)
             );
         ''')
         connection.commit()
-        print("Table user_data created successfully")
         cursor.close()
+        add_updated_at(connection)
+        print("Table user_data created successfully")
     except mysql.connector.Error as err:
         print(f"Error: {err}")
 
-def insert_data(connection, csv_file):
-    """Inserts data from a CSV file into the user_data table if not already present."""
+def add_updated_at(connection):
+    """Adds the updated_at column and its index to a user_data table created without them."""
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data' "
+        "AND COLUMN_NAME = 'updated_at'"
+    )
+    (exists,) = cursor.fetchone()
+    if not exists:
+        cursor.execute(
+            "ALTER TABLE user_data "
+            "ADD COLUMN updated_at TIMESTAMP(6) NOT NULL "
+            "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6), "
+            "ADD INDEX (updated_at, user_id)"
+        )
+        connection.commit()
+    cursor.close()
+
+USER_COLUMNS = ('user_id', 'name', 'email', 'age')
+TABLE_COLUMNS = USER_COLUMNS + ('updated_at',)
+
+def _read_records(f):
+    """Yields (raw_record, end_offset) for each CSV record of a binary file.
+
+    Lines are joined while a quoted field is still open, so a record with an
+    embedded newline comes out whole and end_offset is always a safe place
+    to resume reading from.
+    """
+    pending = b''
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        pending += line
+        if pending.count(b'"') % 2:
+            continue
+        yield pending, f.tell()
+        pending = b''
+    if pending:
+        yield pending, f.tell()
+
+def _parse_records(raw_records):
+    """Parses a list of raw CSV records into lists of fields."""
+    text = b''.join(raw_records).decode('utf-8')
+    return list(csv.reader(io.StringIO(text, newline='')))
+
+def read_csv_chunks(csv_file, chunk_size, offset=None):
+    """Yields (user_tuples, end_offset) chunks of at most chunk_size rows.
+
+    Only one chunk of the file is in memory at a time. When offset is given,
+    reading starts there (it must be an end_offset from a previous run)
+    instead of right after the header.
+    """
+    with open(csv_file, 'rb') as f:
+        records = _read_records(f)
+        header_record, header_end = next(records, (b'', 0))
+        header = next(csv.reader([header_record.decode('utf-8-sig')]), [])
+        missing = [column for column in USER_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"{csv_file} is missing columns: {', '.join(missing)}")
+        positions = [header.index(column) for column in USER_COLUMNS]
+        if offset is not None and offset > header_end:
+            f.seek(offset)
+            records = _read_records(f)
+        raw_chunk = []
+        end_offset = header_end
+        for raw, end_offset in records:
+            if raw.strip():
+                raw_chunk.append(raw)
+            if len(raw_chunk) == chunk_size:
+                yield [tuple(fields[i] for i in positions)
+                       for fields in _parse_records(raw_chunk)], end_offset
+                raw_chunk = []
+        if raw_chunk:
+            yield [tuple(fields[i] for i in positions)
+                   for fields in _parse_records(raw_chunk)], end_offset
+
+def _checkpoint_path(csv_file):
+    return csv_file + '.checkpoint'
+
+def _file_identity(csv_file):
+    """Size and mtime of the CSV, so a checkpoint is not applied to a different file."""
+    stat = os.stat(csv_file)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def load_checkpoint(csv_file):
+    """Returns the saved {'offset', 'rows'} for csv_file, or None to start from the top."""
+    try:
+        with open(_checkpoint_path(csv_file), encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('file') != _file_identity(csv_file):
+        return None
+    return checkpoint
+
+def save_checkpoint(csv_file, offset, rows):
+    """Atomically records that everything up to byte `offset` has been committed."""
+    path = _checkpoint_path(csv_file)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'offset': offset, 'rows': rows, 'file': _file_identity(csv_file)}, f)
+    os.replace(path + '.tmp', path)
+
+def clear_checkpoint(csv_file):
+    """Removes the checkpoint once the whole file has been loaded."""
+    try:
+        os.remove(_checkpoint_path(csv_file))
+    except FileNotFoundError:
+        pass
+
+def _report_rate(rows, started):
+    """Prints how many rows were loaded and at what rate."""
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else 0
+    print(f"Loaded {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+
+def load_data_infile(csv_file):
+    """Bulk loads a CSV file with LOAD DATA LOCAL INFILE, skipping existing user_ids.
+
+    Pooled connections do not allow local files, so the load runs on a
+    dedicated connection opened with allow_local_infile=True. The server
+    must have local_infile enabled, otherwise mysql.connector.Error is raised.
+    """
+    started = time.perf_counter()
+    with open(csv_file, 'rb') as f:
+        first_line = f.readline()
+    header = next(csv.reader([first_line.decode('utf-8-sig')]))
+    # Columns the table does not know about are read into a throwaway variable
+    targets = ', '.join(
+        column if column in USER_COLUMNS else '@skip' for column in header
+    )
+    line_end = '\\r\\n' if first_line.endswith(b'\r\n') else '\\n'
+    connection = mysql.connector.connect(**db_pool.DB_CONFIG, allow_local_infile=True)
     try:
         cursor = connection.cursor()
-        with open(csv_file, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Check if user_id already exists
-                cursor.execute("SELECT user_id FROM user_data WHERE user_id = %s", (row['user_id'],))
-                if cursor.fetchone():
-                    continue
-                cursor.execute(
-                    "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
-                    (row['user_id'], row['name'], row['email'], row['age'])
-                )
+        cursor.execute(
+            "LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data "
+            "CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '{line_end}' IGNORE 1 LINES ({targets})",
+            (csv_file,)
+        )
+        rows = cursor.rowcount
         connection.commit()
         cursor.close()
+    finally:
+        connection.close()
+    _report_rate(rows, started)
+    return rows
+
+def insert_data(connection, csv_file, chunk_size=5000, use_load_data=False, resume=True):
+    """Inserts data from a CSV file into the user_data table if not already present.
+
+    The CSV is streamed in chunks of chunk_size rows; each chunk is written
+    with a single multi-row INSERT (existing user_ids are left untouched) and
+    committed on its own. After every commit the byte offset reached is saved
+    to `<csv_file>.checkpoint`, so with resume=True a rerun after a crash
+    continues from the last committed chunk instead of the top of the file.
+    With use_load_data=True, LOAD DATA LOCAL INFILE is tried first and the
+    chunked path is only used if the server refuses it.
+    Returns the number of rows processed.
+    """
+    if use_load_data:
+        try:
+            return load_data_infile(csv_file)
+        except mysql.connector.Error as err:
+            print(f"LOAD DATA LOCAL INFILE unavailable ({err}), using batched inserts")
+    checkpoint = load_checkpoint(csv_file) if resume else None
+    offset = checkpoint['offset'] if checkpoint else None
+    rows = checkpoint['rows'] if checkpoint else 0
+    if checkpoint:
+        print(f"Resuming {csv_file} after {rows} rows")
+    loaded = 0
+    try:
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        for chunk, end_offset in read_csv_chunks(csv_file, chunk_size, offset):
+            cursor.executemany(
+                "INSERT INTO user_data (user_id, name, email, age) "
+                "VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE user_id = user_id",
+                chunk
+            )
+            connection.commit()
+            loaded += len(chunk)
+            save_checkpoint(csv_file, end_offset, rows + loaded)
+        cursor.close()
+        clear_checkpoint(csv_file)
+        _report_rate(loaded, started)
     except Exception as err:
         print(f"Error: {err}")
+    return rows + loaded
@@ -0,0 +1,118 @@
+import re
+import sqlite3
+
+# mysql-connector uses the %s paramstyle; sqlite3 wants ?
+_PARAM = re.compile(r"%s")
+
+
+class SQLiteCursor:
+    """Cursor with the parts of the mysql-connector cursor API the generators use."""
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, query, params=()):
+        self._cursor.execute(_PARAM.sub('?', query), tuple(params))
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(_PARAM.sub('?', query), seq_params)
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        columns = [column[0] for column in self._cursor.description]
+        return dict(zip(columns, row))
+
+    def _convert_all(self, found):
+        if not self._dictionary or not found:
+            return found
+        columns = [column[0] for column in self._cursor.description]
+        return [dict(zip(columns, row)) for row in found]
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return self._convert_all(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._convert_all(self._cursor.fetchall())
+
+    def __iter__(self):
+        while True:
+            found = self.fetchmany(1000)
+            if not found:
+                return
+            yield from found
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection behind the mysql-connector connection API.
+
+    A stand-in for benchmarking and local runs without a MySQL server: it
+    can be plugged into db_pool with configure(factory=...) and serves the
+    plain SELECT/INSERT statements of the generators. MySQL-only SQL
+    (LOAD DATA, NOW(6), information_schema) is not translated.
+    """
+
+    def __init__(self, path):
+        # Pooled connections move between threads; each is only used by one at a time
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._connection, dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    @property
+    def unread_result(self):
+        return False
+
+    def is_connected(self):
+        try:
+            self._connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self._connection.close()
+
+
+def connect(path):
+    """Opens an SQLite database through the mysql-connector style API."""
+    return SQLiteConnection(path)
+
+
+def create_table(connection):
+    """Creates an SQLite user_data table with the same columns as seed.create_table."""
+    cursor = connection.cursor()
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS user_data ("
+        "user_id CHAR(36) PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "email VARCHAR(255) NOT NULL, "
+        "age DECIMAL NOT NULL, "
+        "updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS user_data_updated_at ON user_data (updated_at, user_id)"
+    )
+    connection.commit()
+    cursor.close()